@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule adaptive campaign. The modeller only needs, for every direction,
+the saturation goodput x_max of each packet size and the slope of the power
+below x_max, which is fitted to alpha0 * (1 + alpha1 / d). Below x_max the
+power is then linear in the parameters:
+
+  P = gamma + alpha0 * x + alpha0 * alpha1 * x / d
+
+so a few well placed stints are enough. The idle power gamma is fitted too,
+one for every meter, with the idle stint of the meter as an observation at
+x = 0, so that the error of the idle baseline is not folded into alpha1.
+Every stint is weighted by the standard error of its median and the errors
+of the parameters are never taken below those implied by the readings.
+
+For every direction the highest rate of each packet size is run first,
+measuring x_max. Stints below x_max are then chosen one at a time, each time
+picking the candidate that most increases the determinant of the information
+matrix of the fit (greedy D-optimal design), until the standard errors of
+alpha0 and alpha1 fall below a fraction of their values. The remaining
+stints are not run.
+"""
+
+import math
+import logging
+import numpy as np
+
+from scheduler import stint_meter
+
+DEFAULT_TOLERANCE = 0.05
+
+# stints in the linear region needed before testing for convergence
+MIN_POINTS = 4
+
+# standard error of the median over that of the mean, for gaussian readings
+MEDIAN_SE = math.sqrt(math.pi / 2)
+
+# lowest standard error of a median, in W
+MIN_SE = 1e-6
+
+def regressors(x, d, meter, meters):
+    """ Return the row of the design matrix of a stint. """
+
+    return [1.0 if meter == m else 0.0 for m in meters] + [x, x / d]
+
+def median_se(stats):
+    """ Return the standard error of the median of a stint, or None. """
+
+    se = stats.get('ci', float('nan')) / 1.96 * MEDIAN_SE
+
+    if math.isnan(se):
+        return None
+
+    return max(se, MIN_SE)
+
+def fit(observations):
+    """ Weighted least squares fit of (x, d, y, se, meter) observations,
+    where y is the median power of a stint measured by meter and se its
+    standard error; idle stints have x = 0. Return alpha0, alpha1 and their
+    standard errors, the latter are None without enough observations. """
+
+    meters = sorted(set(obs[4] for obs in observations))
+    design = np.array([regressors(x, d, meter, meters)
+                       for x, d, _, _, meter in observations])
+    power = np.array([obs[2] for obs in observations])
+    weights = 1.0 / np.array([obs[3] for obs in observations])
+
+    design = design * weights[:, np.newaxis]
+    power = power * weights
+
+    theta, _, rank, _ = np.linalg.lstsq(design, power, rcond=None)
+
+    slope, extra = theta[len(meters):]
+
+    alpha0 = slope
+    alpha1 = extra / slope if slope != 0 else float('inf')
+
+    dof = len(observations) - len(theta)
+
+    if rank < len(theta) or dof < 1 or slope == 0:
+        return alpha0, alpha1, None, None
+
+    # a scatter wider than the readings explain, e.g. a poor model, widens
+    # the errors, a lucky narrow one does not shrink them
+    residuals = power - design.dot(theta)
+    scale = max(1.0, residuals.dot(residuals) / dof)
+
+    cov = scale * np.linalg.inv(design.T.dot(design))[len(meters):,
+                                                      len(meters):]
+
+    # delta method for alpha1 = extra / slope
+    grad = np.array([-extra / slope ** 2, 1.0 / slope])
+
+    se0 = np.sqrt(cov[0, 0])
+    se1 = np.sqrt(grad.dot(cov).dot(grad))
+
+    return alpha0, alpha1, se0, se1
+
+class Design(object):
+    """ Sequential design of the stints of one direction. The idle callable
+    returns the statistics of the idle stint of a meter. """
+
+    def __init__(self, data, name, indexes, idle,
+                 tolerance=DEFAULT_TOLERANCE):
+
+        self.data = data
+        self.name = name
+        self.pending = set(indexes)
+        self.idle = idle
+        self.tolerance = tolerance
+        self.converged = False
+
+        stint = data['stints'][indexes[0]]
+        self.direction = (stint['src'], stint['dst'])
+
+    def stints(self):
+        """ Return the indexes of all the stints of this direction. """
+
+        return [i for i, stint in enumerate(self.data['stints'])
+                if (stint['src'], stint['dst']) == self.direction]
+
+    def x_max(self):
+        """ Return the saturation goodput (Mb/s) measured for each size. """
+
+        x_max = {}
+
+        for i in self.stints():
+
+            stint = self.data['stints'][i]
+
+            if 'stats' not in stint or 'gp' not in stint['stats']:
+                continue
+
+            size = stint['packetsize_bytes']
+            gp_mbps = stint['stats']['gp'] / 1000000
+            x_max[size] = max(x_max.get(size, 0.0), gp_mbps)
+
+        return x_max
+
+    def saturation(self):
+        """ Return the pending stint at the highest rate of a packet size
+        whose highest rate has not been run yet, or None. """
+
+        highest = {}
+
+        for i in self.stints():
+            stint = self.data['stints'][i]
+            size = stint['packetsize_bytes']
+            if size not in highest or \
+               stint['bitrate_mbps'] > highest[size][0]:
+                highest[size] = (stint['bitrate_mbps'], i)
+
+        for size in sorted(highest):
+            if highest[size][1] in self.pending:
+                return highest[size][1]
+
+        return None
+
+    def observations(self, x_max):
+        """ Return the (x, d, y, se, meter) observations below x_max,
+        followed by those of the idle stints of their meters. """
+
+        observations = []
+
+        for i in self.stints():
+
+            stint = self.data['stints'][i]
+
+            if i in self.pending or 'stats' not in stint:
+                continue
+
+            size = stint['packetsize_bytes']
+
+            if stint['bitrate_mbps'] >= x_max.get(size, 0.0):
+                continue
+
+            se = median_se(stint['stats'])
+
+            if se is None:
+                continue
+
+            observations.append((float(stint['bitrate_mbps']),
+                                 float(size),
+                                 stint['stats']['median'],
+                                 se,
+                                 stint_meter(self.data, stint)))
+
+        for meter in sorted(set(obs[4] for obs in observations)):
+
+            stats = self.idle(meter)
+            se = median_se(stats)
+
+            if se is not None:
+                observations.append((0.0, 1.0, stats['median'], se, meter))
+
+        return observations
+
+    def check(self, observations):
+        """ Fit the observations and return True if converged. """
+
+        stints = len([obs for obs in observations if obs[0] > 0])
+
+        if stints < 2:
+            return False
+
+        alpha0, alpha1, se0, se1 = fit(observations)
+
+        if se0 is None:
+            return False
+
+        logging.info("%s: alpha0 %f (+/- %f), alpha1 %f (+/- %f) from %u "
+                     "stints", self.name, alpha0, se0, alpha1, se1, stints)
+
+        if stints < MIN_POINTS:
+            return False
+
+        return se0 <= self.tolerance * abs(alpha0) and \
+               se1 <= self.tolerance * abs(alpha1)
+
+    def next(self):
+        """ Pick the next stint to run and return its index, or None when
+        the design is complete. """
+
+        if self.converged:
+            return None
+
+        i = self.saturation()
+
+        if i is None:
+
+            x_max = self.x_max()
+            observations = self.observations(x_max)
+
+            if self.check(observations):
+                logging.info("%s: converged, skipping %u stints", self.name,
+                             len(self.pending))
+                self.converged = True
+                return None
+
+            i = self.informative(observations, x_max)
+
+        if i is not None:
+            self.pending.discard(i)
+
+        return i
+
+    def informative(self, observations, x_max):
+        """ Return the pending stint below x_max maximizing the prediction
+        variance of the fit, i.e. the increase of the determinant of the
+        information matrix, or None. """
+
+        meters = sorted(set(obs[4] for obs in observations))
+        candidates = []
+
+        for i in sorted(self.pending):
+
+            stint = self.data['stints'][i]
+            size = stint['packetsize_bytes']
+            x = float(stint['bitrate_mbps'])
+
+            if x >= x_max.get(size, 0.0):
+                continue
+
+            meter = stint_meter(self.data, stint)
+
+            if meter not in meters:
+                meters.append(meter)
+
+            candidates.append((i, x, float(size), meter))
+
+        info = np.zeros((len(meters) + 2, len(meters) + 2))
+
+        for x, size, _, se, meter in observations:
+            row = np.array(regressors(x, size, meter, meters)) / se
+            info += np.outer(row, row)
+
+        # a small ridge keeps the matrix invertible in the first steps
+        info += np.eye(len(info)) * 1e-6 * max(1.0, np.trace(info))
+        inverse = np.linalg.inv(info)
+
+        best = None
+        best_gain = 0.0
+
+        for i, x, size, meter in candidates:
+
+            row = np.array(regressors(x, size, meter, meters))
+            gain = row.dot(inverse).dot(row)
+
+            if gain > best_gain:
+                best, best_gain = i, gain
+
+        return best
+
+def designs(data, indexes, idle, tolerance=DEFAULT_TOLERANCE):
+    """ Return a Design for every direction of the given stints. """
+
+    lookup = dict(((model['src'], model['dst']), name)
+                  for name, model in data.get('models', {}).items())
+
+    groups = {}
+
+    for i in indexes:
+        stint = data['stints'][i]
+        groups.setdefault((stint['src'], stint['dst']), []).append(i)
+
+    return [Design(data, lookup.get(pair, '%s -> %s' % pair), groups[pair],
+                   idle, tolerance) for pair in sorted(groups)]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Airtime model. It computes the time needed to deliver a UDP
+datagram over a WLAN link (DIFS, data frame, SIFS, ACK and worst case
+backoff) and thus the maximum number of transactions per second (TPS) the
+link can sustain. Datagrams larger than the MTU are split in halves until
+every fragment fits. Tables covering every payload length are computed once
+per (hwmode, channel, streams, mtu) and cached, so that whole grids of
+packet sizes can be looked up at once.
+"""
+
+import numpy as np
+
+DEFAULT_MTU = 1472
+
+# largest UDP payload
+MAX_LENGTH = 65507
+
+# bits per OFDM symbol of the fastest MCS of a single spatial stream
+_HT_BITS_PER_SYMBOL = {('11n', '20') : 260,
+                       ('11n', '40') : 540,
+                       ('11ac', '20') : 312,
+                       ('11ac', '40') : 720,
+                       ('11ac', '80') : 1560}
+
+# number of long training fields sent for a given number of streams
+_LTFS = {1 : 1, 2 : 2, 3 : 4, 4 : 4}
+
+def _build_modes():
+    """ Return the PHY parameters of the supported modes. """
+
+    modes = {}
+
+    # preamble (L-STF, L-LTF, L-SIG), 6 tail bits
+    modes[('11a', '20', 1)] = {'difs' : 34,
+                               'sifs' : 16,
+                               'slot' : 9,
+                               'min_cw' : 15,
+                               'preamble' : 20,
+                               'overhead_bits' : 6,
+                               'symbol_duration' : 4,
+                               'bits_per_symbol' : 216}
+
+    # ERP-OFDM with short slots
+    modes[('11g', '20', 1)] = {'difs' : 28,
+                               'sifs' : 10,
+                               'slot' : 9,
+                               'min_cw' : 15,
+                               'preamble' : 20,
+                               'overhead_bits' : 6,
+                               'symbol_duration' : 4,
+                               'bits_per_symbol' : 216}
+
+    # HT-mixed and VHT preambles, 16 service bits and 6 tail bits
+    for (hwmode, channel), bits in _HT_BITS_PER_SYMBOL.items():
+
+        for streams in range(1, 5):
+
+            if hwmode == '11n':
+                preamble = 32 + 4 * _LTFS[streams]
+            else:
+                preamble = 36 + 4 * _LTFS[streams]
+
+            modes[(hwmode, channel, streams)] = {'difs' : 34,
+                                                 'sifs' : 16,
+                                                 'slot' : 9,
+                                                 'min_cw' : 15,
+                                                 'preamble' : preamble,
+                                                 'overhead_bits' : 22,
+                                                 'symbol_duration' : 4,
+                                                 'bits_per_symbol' :
+                                                     bits * streams}
+
+    return modes
+
+MODES = _build_modes()
+
+_TABLES = {}
+
+def _splits(length, mtu):
+    """ Return how many times length must be halved to fit the mtu. """
+
+    splits = np.zeros(np.shape(length), dtype=np.int64)
+    oversized = length > mtu
+
+    if np.any(oversized):
+        ratio = np.asarray(length, dtype=np.float64) / (mtu + 1)
+        splits = np.where(oversized,
+                          np.floor(np.log2(np.maximum(ratio, 1))) + 1,
+                          0).astype(np.int64)
+        # guard against rounding in log2
+        splits = splits + ((length >> splits) > mtu)
+
+    return splits
+
+def _frame_usec(mode, length):
+    """ Return the time needed to send frames carrying length bytes of UDP
+    payload, length must not exceed the mtu. """
+
+    params = MODES[mode]
+
+    # remove ethernet header push mac header
+    length = length + 8 + 20 + 28 + 8
+
+    # compute number of symbols required
+    symbols = np.ceil((length * 8.0 + params['overhead_bits']) /
+                      params['bits_per_symbol'])
+
+    data = params['preamble'] + symbols * params['symbol_duration']
+
+    # 20 usec synch header, plus one ack symbol
+    ack = 20 + params['symbol_duration']
+
+    # worst case backoff
+    backoff = params['slot'] * params['min_cw']
+
+    return params['difs'] + data + params['sifs'] + ack + backoff
+
+def tx_usec_table(hwmode, channel, streams, mtu=DEFAULT_MTU):
+    """ Return the (cached) table of the time needed to send a datagram,
+    indexed by UDP payload length from 0 to MAX_LENGTH. """
+
+    key = (hwmode, channel, int(streams), mtu)
+
+    if key not in _TABLES:
+
+        mode = key[0:3]
+
+        if mode not in MODES:
+            raise KeyError("unsupported mode %s/%s/%u" % mode)
+
+        lengths = np.arange(0, MAX_LENGTH + 1, dtype=np.int64)
+        splits = _splits(lengths, mtu)
+
+        table = (1 << splits) * _frame_usec(mode, lengths >> splits)
+        table.flags.writeable = False
+
+        _TABLES[key] = table
+
+    return _TABLES[key]
+
+def tx_usec(hwmode, channel, streams, sizes, mtu=DEFAULT_MTU):
+    """ Return the time needed to send datagrams of the given sizes, sizes
+    can be a scalar or an array. Raise ValueError if a size is not a valid
+    UDP payload length. """
+
+    table = tx_usec_table(hwmode, channel, streams, mtu)
+    sizes = np.asarray(sizes, dtype=np.int64)
+
+    if np.any(sizes < 0) or np.any(sizes > MAX_LENGTH):
+        raise ValueError("UDP payload length must be between 0 and %u" %
+                         MAX_LENGTH)
+
+    return table[sizes]
+
+def max_tps(hwmode, channel, streams, sizes, mtu=DEFAULT_MTU):
+    """ Return the maximum transactions per second for datagrams of the
+    given sizes, sizes can be a scalar or an array. """
+
+    return 1000000 / tx_usec(hwmode, channel, streams, sizes, mtu)
+
+def max_goodput_bps(hwmode, channel, streams, sizes, mtu=DEFAULT_MTU):
+    """ Return the maximum theoretical goodput for datagrams of the given
+    sizes, sizes can be a scalar or an array. """
+
+    sizes = np.asarray(sizes, dtype=np.int64)
+
+    return sizes * 8 * max_tps(hwmode, channel, streams, sizes, mtu)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Power meter backends. A backend is any object whose fetch('power') method
+blocks until the next reading is available and returns it. Backends are
+created by name from a dictionary of settings, see create_backend:
+
+  energino:   an Energino on a serial port (device, bps, interval)
+  replay:     a recorded power trace replayed at a given rate (trace, rate)
+  synthetic:  readings computed from a models.json file for the traffic
+              generated by the current stint, plus gaussian noise
+              (models, directions, rate, noise)
+
+A rate of 0 means as fast as possible. Backends may also implement
+start_stint(stint) and stop_stint(), which are called by the profiler when
+a stint starts and stops.
+"""
+
+import os
+import json
+import random
+import datetime
+import numpy as np
+
+from clock import get_clock
+
+try:
+    from energino.energino import PyEnergino
+    from energino.energino import DEFAULT_DEVICE
+    from energino.energino import DEFAULT_DEVICE_SPEED_BPS
+    from energino.energino import DEFAULT_INTERVAL
+except ImportError:
+    PyEnergino = None
+    DEFAULT_DEVICE = '/dev/ttyACM0'
+    DEFAULT_DEVICE_SPEED_BPS = 115200
+    DEFAULT_INTERVAL = 200
+
+DEFAULT_BACKEND = 'energino'
+DEFAULT_RATE = 5
+DEFAULT_NOISE = 0.05
+
+class PacedBackend(object):
+    """ Base class for the backends producing readings at a fixed rate. The
+    schedule is absolute, so that the rate does not drift. """
+
+    def __init__(self, rate):
+
+        self.rate = rate
+        self.next = None
+
+    def wait(self):
+        """ Wait for the next reading to be due. """
+
+        if self.rate <= 0:
+            return
+
+        clock = get_clock()
+        now = clock.time()
+
+        if self.next is None or self.next < now - 1:
+            self.next = now
+
+        self.next += 1.0 / self.rate
+
+        if self.next > now:
+            clock.sleep(self.next - now)
+
+    def reading(self):
+        """ Return the next power reading. """
+        raise NotImplementedError()
+
+    def fetch(self, field=None):
+        """ Fetch statistics. """
+
+        self.wait()
+
+        readings = {}
+        readings['power'] = self.reading()
+        readings['at'] = \
+            datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+        if field != None:
+            return readings[field]
+        return readings
+
+class ReplayBackend(PacedBackend):
+    """ Replay a power trace, looping over it. The trace is a text file with
+    one reading per line; when lines have several columns, e.g. a timestamp
+    and the power, the last column is used. """
+
+    def __init__(self, trace, rate=DEFAULT_RATE):
+
+        super(ReplayBackend, self).__init__(rate)
+
+        samples = np.loadtxt(os.path.expanduser(trace), ndmin=2)
+
+        if samples.size == 0:
+            raise ValueError("empty trace %s" % trace)
+
+        self.samples = samples[:, -1]
+        self.index = 0
+
+    def reading(self):
+
+        value = self.samples[self.index]
+        self.index = (self.index + 1) % len(self.samples)
+
+        return float(value)
+
+class SyntheticBackend(PacedBackend):
+    """ Generate readings from a power model. Directions map the (src, dst)
+    pair of a stint to a model name (see the 'models' entry of the Joule
+    descriptor). """
+
+    def __init__(self, models, directions, rate=DEFAULT_RATE,
+                 noise=DEFAULT_NOISE):
+
+        super(SyntheticBackend, self).__init__(rate)
+
+        with open(os.path.expanduser(models)) as data_file:
+            self.models = json.load(data_file)
+
+        self.directions = dict(((v['src'], v['dst']), k)
+                               for k, v in directions.items())
+
+        self.noise = noise
+        self.power = self.models['gamma']
+
+    def start_stint(self, stint):
+        """ Account for the traffic generated by stint. """
+
+        model = self.directions.get((stint['src'], stint['dst']))
+
+        if model not in self.models:
+            return
+
+        alpha0 = self.models[model]['alpha0']
+        alpha1 = self.models[model]['alpha1']
+        d_bytes = stint['packetsize_bytes']
+        x_mbps = stint['bitrate_mbps']
+        x_max = self.models[model]['x_max'].get(str(d_bytes), x_mbps)
+
+        alpha_d = alpha0 * (1 + (alpha1 / d_bytes))
+        self.power = alpha_d * min(x_mbps, x_max) + self.models['gamma']
+
+    def stop_stint(self):
+        """ Go back to idle. """
+
+        self.power = self.models['gamma']
+
+    def reading(self):
+        return self.power + random.gauss(0, self.noise)
+
+def energino_backend(settings):
+    """ Create an Energino backend. """
+
+    if PyEnergino is None:
+        raise ValueError("energino is not installed")
+
+    return PyEnergino(settings['device'],
+                      settings['bps'],
+                      settings['interval'])
+
+def replay_backend(settings):
+    """ Create a trace replay backend. """
+
+    if settings.get('trace') is None:
+        raise ValueError("the replay backend requires a trace")
+
+    return ReplayBackend(settings['trace'],
+                         settings.get('rate', DEFAULT_RATE))
+
+def synthetic_backend(settings):
+    """ Create a synthetic backend. """
+
+    if settings.get('models') is None:
+        raise ValueError("the synthetic backend requires a models file")
+
+    return SyntheticBackend(settings['models'],
+                            settings.get('directions', {}),
+                            settings.get('rate', DEFAULT_RATE),
+                            settings.get('noise', DEFAULT_NOISE))
+
+BACKENDS = {'energino' : energino_backend,
+            'replay' : replay_backend,
+            'synthetic' : synthetic_backend}
+
+def create_backend(name, settings):
+    """ Create the backend registered as name. """
+
+    if name not in BACKENDS:
+        raise ValueError("unknown backend %s" % name)
+
+    return BACKENDS[name](settings)
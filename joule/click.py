@@ -27,45 +27,294 @@
 
 """
 Handle the communications with the click ControlSocket element. It supports
-basic READ and WRITE handlers. It does NOT support multiple read/write
-statements.
+basic READ and WRITE handlers, either one at a time or pipelined in batches
+with batch_handlers. Connections are pooled: a single long-lived session is
+kept for every (address, port) pair, the ControlSocket banner is parsed once
+when the session is opened and then any number of READ/WRITE statements are
+executed over the same stream. Every operation on a session is bounded by a
+timeout, so that a dead probe does not block the caller forever. Listeners
+registered with add_listener are told the round-trip time of every batch.
 """
 
+import time
 import socket
+import threading
 
-def _handler(address, port, read_write, handler):
-    """ Connect to the ControlSocket element and call 'handler'. """
+BANNER = "Click::ControlSocket/1.3"
+DEFAULT_TIMEOUT = 5.0
+BUFFER_SIZE = 4096
+
+# replies to a handler whose element or name does not exist
+MISSING_HANDLER = ('510', '511')
+
+_LISTENERS = []
+
+def _str(data):
+    """ Convert a bytearray received from the socket to a native string. """
+
+    if str is bytes:
+        return bytes(data)
+    return data.decode('latin-1')
+
+class ControlSocket(object):
+    """ A persistent session with a click ControlSocket element.
+
+    Replies are parsed incrementally: data is received straight into a
+    preallocated buffer, status lines are scanned only once and DATA
+    payloads are received in place into a buffer of the declared length,
+    so that large reads are linear in the payload size.
+
+    """
+
+    def __init__(self, address, port, timeout=DEFAULT_TIMEOUT):
+
+        self.address = address
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buf = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.sessions = 0
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """ Open the session and check the banner. Return False if the
+        remote end is not a click ControlSocket. """
+
+        self.sock = socket.create_connection((self.address, self.port),
+                                             self.timeout)
+        self.start = 0
+        self.end = 0
+        self.sessions += 1
+
+        if not self._readline().startswith(BANNER):
+            self.close()
+            return False
+
+        return True
+
+    def close(self):
+        """ Close the session. """
+
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+        self.sock = None
+        self.start = 0
+        self.end = 0
+
+    def _recv_into(self, view):
+        """ Receive data into view, return the number of bytes received. """
+
+        received = self.sock.recv_into(view)
+        if received == 0:
+            raise socket.error("connection closed by %s:%u" % (self.address,
+                                                                 self.port))
+        self.received += received
+        return received
+
+    def _recv(self):
+        """ Receive more data at the end of the buffer, making room for it
+        if needed. """
+
+        if self.end == len(self.buf):
+
+            pending = self.end - self.start
+
+            if self.start > 0:
+                self.buf[0:pending] = self.view[self.start:self.end]
+            else:
+                buf = bytearray(2 * len(self.buf))
+                buf[0:pending] = self.view[self.start:self.end]
+                self.buf = buf
+                self.view = memoryview(self.buf)
+
+            self.start = 0
+            self.end = pending
+
+        self.end += self._recv_into(self.view[self.end:])
+
+    def _readline(self):
+        """ Read a CRLF terminated line. """
+
+        scanned = 0
+
+        while True:
+
+            eol = self.buf.find(b'\r\n', self.start + scanned, self.end)
+
+            if eol >= 0:
+                break
+
+            scanned = max(0, self.end - self.start - 1)
+            self._recv()
+
+        line = self.buf[self.start:eol]
+
+        self.start = eol + 2
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+        return _str(line)
+
+    def _read(self, length):
+        """ Read exactly length bytes. Whatever does not fit the pending
+        data is received directly into the returned buffer. """
+
+        pending = self.end - self.start
+
+        if pending >= length:
+            data = self.buf[self.start:self.start + length]
+            self.start += length
+            return _str(data)
+
+        data = bytearray(length)
+        view = memoryview(data)
+        view[0:pending] = self.view[self.start:self.end]
+
+        self.start = 0
+        self.end = 0
+
+        while pending < length:
+            pending += self._recv_into(view[pending:])
 
-    ctrl = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    ctrl.connect((address, port))
-    ctrl.send("%s %s\nQUIT\n" % (read_write, handler))
+        return _str(data)
 
-    buf = ''
+    def _response(self, read_write):
+        """ Parse the response to a single statement. Multi-line replies
+        have a '-' after the status code on all but the last line. """
 
-    while True:
-        data = ctrl.recv(1024)
-        if not data:
-            break
-        buf += data
+        line = self._readline()
 
-    if not buf.startswith("Click::ControlSocket/1.3"):
-        return None
+        while line[3:4] == '-':
+            line = self._readline()
 
-    buf = buf[buf.find('\r\n')+2:]
+        code = line[0:3]
+        message = line[4:]
 
-    if buf[0:3] != "200":
-        return [buf[0:3], buf[4:buf.find('\r\n')], '']
+        if read_write != 'READ' or code != "200":
+            return [code, message, '']
 
-    data = buf[buf.find('\r\n')+2:]
+        data = self._readline()
 
-    if not data.startswith("DATA"):
-        return [buf[0:3], buf[4:buf.find('\r\n')], '']
+        if not data.startswith("DATA"):
+            return [code, message, '']
+
+        length = int(data[data.find(' ')+1:])
+
+        return [code, message, self._read(length)]
+
+    def execute(self, read_write, handler):
+        """ Execute a READ or WRITE statement. """
+
+        responses = self.execute_batch([(read_write, handler)])
+
+        if responses is None:
+            return None
+
+        return responses[0]
+
+    def execute_batch(self, statements):
+        """ Pipeline a list of (read_write, handler) statements in a single
+        send and return the responses in the same order. A pooled session
+        found stale, i.e. failing before any reply byte arrived, is reopened
+        once; any other error, timeouts included, is raised at once so that
+        the batch is never replayed. """
+
+        batch = "".join(["%s %s\n" % stmt for stmt in statements])
+        batch = batch.encode('latin-1')
+
+        with self.lock:
+
+            for attempt in range(0, 2):
+
+                reused = self.sock is not None
+
+                try:
+
+                    if self.sock is None and not self.connect():
+                        return None
+
+                    start = time.time()
+                    self.received = 0
+
+                    self.sock.sendall(batch)
+
+                    responses = [self._response(stmt[0])
+                                 for stmt in statements]
+
+                    elapsed = time.time() - start
+
+                    for listener in _LISTENERS:
+                        listener(self.address, self.port, statements,
+                                 elapsed)
+
+                    return responses
+
+                except socket.timeout:
+
+                    self.close()
+                    raise
+
+                except socket.error:
+
+                    self.close()
+
+                    if attempt > 0 or not reused or self.received > 0:
+                        raise
+
+_POOL = {}
+_POOL_LOCK = threading.Lock()
+
+def get_control_socket(address, port):
+    """ Return the pooled session for (address, port). """
+
+    with _POOL_LOCK:
+
+        if (address, port) not in _POOL:
+            _POOL[(address, port)] = ControlSocket(address, port)
+
+        return _POOL[(address, port)]
+
+def close_all():
+    """ Close all the pooled sessions. """
+
+    with _POOL_LOCK:
+
+        for ctrl in _POOL.values():
+            with ctrl.lock:
+                ctrl.close()
+
+        _POOL.clear()
+
+def add_listener(listener):
+    """ Call listener(address, port, statements, elapsed) after every
+    batch of statements is executed. """
+
+    _LISTENERS.append(listener)
+
+def remove_listener(listener):
+    """ Stop calling listener. """
+
+    _LISTENERS.remove(listener)
+
+def _handler(address, port, read_write, handler):
+    """ Call 'handler' over the pooled session to the ControlSocket. """
 
-    length = int(data[data.find(' ')+1:data.find('\r\n')])
+    return get_control_socket(address, port).execute(read_write, handler)
 
-    data = data[data.find('\r\n')+2:]
+def batch_handlers(address, port, statements):
+    """ Pipeline a list of (read_write, handler) statements to the
+    ControlSocket element and return the responses in order. """
 
-    return [buf[0:3], buf[4:buf.find('\r\n')], data[0:length]]
+    return get_control_socket(address, port).execute_batch(statements)
 
 def read_handler(address, port, handler):
     """ Connect to the ControlSocket element and read 'handler'. """
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Clocks used to time stints, settle waits and power sampling. The wall clock
+is the default. The virtual clock simulates time: it only advances when all
+the threads taking part in the simulation are sleeping, and then jumps to
+the earliest wake up time, so that hours of stints run in seconds. Threads
+take part in the simulation once attached to the clock; a thread must be
+attached before its parent stops running, which is why threads are attached
+by their parent and detach themselves when done.
+"""
+
+import time
+import heapq
+import threading
+
+class WallClock(object):
+    """ The system clock. """
+
+    def time(self):
+        """ Return the current time in seconds. """
+        return time.time()
+
+    def sleep(self, seconds):
+        """ Sleep for the given number of seconds. """
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def attach(self):
+        """ Account for a new running thread. """
+        pass
+
+    def detach(self):
+        """ Account for a running thread that is done. """
+        pass
+
+class VirtualClock(object):
+    """ Discrete event clock. """
+
+    def __init__(self, start=None):
+
+        self.now = time.time() if start is None else start
+        self.cond = threading.Condition()
+        self.running = 0
+        self.sleepers = []
+        self.seq = 0
+
+    def time(self):
+        """ Return the current virtual time in seconds. """
+        return self.now
+
+    def _advance(self):
+        """ If no thread is running, jump to the earliest wake up time and
+        wake up all the threads due at that time. """
+
+        if self.running > 0 or not self.sleepers:
+            return
+
+        self.now = max(self.now, self.sleepers[0][0])
+
+        while self.sleepers and self.sleepers[0][0] <= self.now:
+            sleeper = heapq.heappop(self.sleepers)
+            sleeper[2][0] = True
+            self.running += 1
+
+        self.cond.notify_all()
+
+    def sleep(self, seconds):
+        """ Sleep for the given number of virtual seconds. """
+
+        if seconds <= 0:
+            return
+
+        with self.cond:
+
+            woken = [False]
+
+            self.seq += 1
+            heapq.heappush(self.sleepers, (self.now + seconds, self.seq, woken))
+
+            self.running -= 1
+            self._advance()
+
+            while not woken[0]:
+                self.cond.wait()
+
+    def attach(self):
+        """ Account for a new running thread. """
+
+        with self.cond:
+            self.running += 1
+
+    def detach(self):
+        """ Account for a running thread that is done. """
+
+        with self.cond:
+            self.running -= 1
+            self._advance()
+
+_CLOCK = WallClock()
+
+def get_clock():
+    """ Return the clock in use. """
+    return _CLOCK
+
+def set_clock(clock):
+    """ Set the clock in use. """
+    global _CLOCK
+    _CLOCK = clock
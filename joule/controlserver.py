@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A minimal server side implementation of the click ControlSocket protocol.
+Elements are plain Python objects exposing their read handlers as methods
+named read_<handler> and their write handlers as methods named
+write_<handler>, the latter receiving the handler argument as a string.
+Statements are executed one line at a time, so clients may pipeline them.
+"""
+
+import time
+import socket
+import logging
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+BANNER = "Click::ControlSocket/1.3"
+VERSION = "2.0.1"
+
+class Element(object):
+    """ Base class for the elements exposed by a ControlServer. """
+
+    def handlers(self):
+        """ Return the names of the handlers exported by this element. """
+
+        names = set()
+        for attr in dir(self):
+            if attr.startswith('read_') or attr.startswith('write_'):
+                names.add(attr.split('_', 1)[1])
+        return sorted(names)
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """ Serve a single ControlSocket session. """
+
+    # replies are written one statement at a time
+    disable_nagle_algorithm = True
+
+    def reply(self, code, message, data=None):
+        """ Send a reply, followed by a DATA block if data is not None. """
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        out = "%s %s\r\n" % (code, message)
+        if data is not None:
+            out += "DATA %u\r\n%s" % (len(data), data)
+
+        self.wfile.write(out.encode('latin-1'))
+        self.wfile.flush()
+
+    def handle(self):
+
+        self.wfile.write(("%s\r\n" % BANNER).encode('latin-1'))
+        self.wfile.flush()
+
+        for line in iter(self.rfile.readline, b''):
+
+            line = line.decode('latin-1').strip()
+
+            if not line:
+                continue
+
+            command, _, statement = line.partition(' ')
+            command = command.upper()
+
+            if command == 'QUIT':
+                self.reply(200, "Goodbye!")
+                break
+
+            if command not in ('READ', 'WRITE'):
+                self.reply(501, "Unimplemented command '%s'" % command)
+                continue
+
+            handler, _, arg = statement.partition(' ')
+
+            try:
+                self.call(command, handler, arg)
+            except socket.error:
+                break
+
+    def call(self, command, handler, arg):
+        """ Call handler and send the reply. """
+
+        element, _, name = handler.rpartition('.')
+        verb = 'Read' if command == 'READ' else 'Write'
+
+        if element:
+            if element not in self.server.elements:
+                self.reply(510, "No element named '%s'" % element)
+                return
+            target = self.server.elements[element]
+        else:
+            target = self.server
+
+        method = getattr(target, '%s_%s' % (command.lower(), name), None)
+
+        if method is None:
+            self.reply(511, "No %s handler named '%s'" % (verb.lower(),
+                                                          handler))
+            return
+
+        with self.server.lock:
+            try:
+                if command == 'READ':
+                    data = str(method())
+                else:
+                    method(arg)
+                    data = None
+            except (ValueError, TypeError) as ex:
+                self.reply(520, "%s handler '%s' error: %s" % (verb, handler,
+                                                               ex))
+                return
+
+        self.reply(200, "%s handler '%s' OK" % (verb, handler), data)
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    """ ControlSocket server exposing a dictionary of elements. Each
+    reply is delayed by latency seconds. """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, elements, address='127.0.0.1', latency=0.0):
+
+        socketserver.ThreadingTCPServer.__init__(self,
+                                                 (address, port),
+                                                 ControlHandler)
+
+        self.elements = elements
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.port = self.server_address[1]
+        self.thread = None
+
+    def read_version(self):
+        """ Global 'version' handler. """
+
+        return VERSION
+
+    def read_list(self):
+        """ Global 'list' handler. """
+
+        names = sorted(self.elements.keys())
+        return "%u\n%s\n" % (len(names), "\n".join(names))
+
+    def start(self):
+        """ Serve requests in a background thread. """
+
+        logging.info("starting control socket on port %u", self.port)
+
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """ Stop serving requests and close the listening socket. """
+
+        logging.info("stopping control socket on port %u", self.port)
+
+        self.shutdown()
+        self.server_close()
@@ -28,19 +28,40 @@
 """
 The Joule Daemon. At least two daemons should be configured on a network.
 Daemons are controller by Joule Profiler which can trigger different traffic
-generation patterns. At the moment only UDP CBR flows are supported. Daemons
-can be started using CLI options (not recommended) or by passing a Joule
-descriptor file generated with the joule-template command and by specifying
-the probe id.
+generation patterns. Daemons can be started using CLI options (not
+recommended) or by passing a Joule descriptor file generated with the
+joule-template command and by specifying the probe ids. Every probe runs a
+receiver and a sender, either click processes, which are restarted when they
+exit, or the built-in python engine (see the engine module). Click probes
+generate UDP CBR flows, the python engine also Poisson, ON/OFF and trace
+driven flows.
+
+Command Line Arguments:
+
+  --joule, -j:      joule descriptor, e.g. ~/joule.json
+  --probe, -p:      ids of the probes to host, e.g. A,B
+  --all, -a:        host all the probes of the descriptor
+  --engine, -e:     click or python
+  --health:         control port exposing the ready and health handlers of
+                    every process, e.g. READ A_sender.health
+  --log_rate:       lines per second logged for each click process
+  --raw_log:        file receiving the whole output of the click processes
 """
 
 import os
 import json
+import time
+import socket
 import optparse
 import logging
 import threading
 import subprocess
 
+from click import read_handler
+from controlserver import Element, ControlServer
+from engine import EngineSender, EngineReceiver
+from logreactor import LogReactor, DEFAULT_RATE as DEFAULT_LOG_RATE
+
 CLICK_SENDER = """
 src :: RatedSource(ACTIVE false)
   -> counter_client :: Counter()
@@ -64,33 +85,252 @@ DEFAULT_RECEIVER_PORT = 9998
 DEFAULT_SENDER_PORT = 9999
 DEFAULT_CONTROL = 7777
 
+CLICK = "/usr/local/bin/click"
+
+DEFAULT_ENGINE = 'click'
+
+# seconds for a click process to answer on its ControlSocket
+READY_TIMEOUT = 10.0
+READY_INTERVAL = 0.2
+
+# restart backoff, reset once a process has run for STABLE_TIME seconds
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+STABLE_TIME = 60.0
+
 LOG_FORMAT = '%(asctime)-15s %(message)s'
 
-class ClickDaemon(threading.Thread):
-    """ ClickDaemin class. """
+class ClickDaemon(threading.Thread, Element):
+    """ ClickDaemon class. Runs a click process and restarts it when it
+    exits, waiting longer after each failure. The process is ready once its
+    ControlSocket answers; a process not ready within READY_TIMEOUT seconds
+    is killed and restarted. The ready and health read handlers expose the
+    state of the process through the health ControlServer. """
 
-    def __init__(self, script, mode):
+    def __init__(self, script, mode, control, reactor):
         super(ClickDaemon, self).__init__()
         logging.debug(script)
-        self.script = "/usr/local/bin/click -e \"%s\"" % script
+        self.script = script
         self.mode = mode
+        self.control = control
+        self.reactor = reactor
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
 
-    def run(self):
+    def wait_ready(self, click):
+        """ Wait for the ControlSocket of a click process to answer. """
 
-        logging.info("starting click process (%s)", self.mode)
+        start = time.time()
+
+        while time.time() - start < READY_TIMEOUT:
+
+            if click.poll() is not None or self.stop_event.is_set():
+                return False
+
+            try:
+                if read_handler('127.0.0.1', self.control, 'version'):
+                    return True
+            except socket.error:
+                pass
+
+            time.sleep(READY_INTERVAL)
 
-        click = subprocess.Popen(self.script,
-                                 shell=True,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT)
+        return False
 
-        for line in iter(click.stdout.readline, ""):
-            logging.debug(line.replace("\n", ""))
+    def spawn(self):
+        """ Start a click process, return None if it cannot be started,
+        e.g. because the click binary is missing. """
+
+        logging.info("starting click process (%s)", self.mode)
+
+        try:
+            return subprocess.Popen([CLICK, "-e", self.script],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+        except OSError as ex:
+            logging.error("cannot start click %s process: %s", self.mode, ex)
+            return None
+
+    def supervise(self, click):
+        """ Wait for a click process to be ready and then to exit. """
+
+        self.process = click
+        self.reactor.register(click.stdout, self.mode)
+
+        if self.wait_ready(click):
+            logging.info("click %s process ready on port %u", self.mode,
+                                                              self.control)
+            self.ready.set()
+        elif click.poll() is None:
+            logging.warning("click %s process not ready after %fs",
+                            self.mode, READY_TIMEOUT)
+            click.kill()
 
         retval = click.wait()
+        self.ready.clear()
+
+        logging.info("click %s process terminated with code %d",
+                     self.mode, retval)
+
+    def run(self):
+
+        failures = 0
+
+        while not self.stop_event.is_set():
+
+            self.started = time.time()
+
+            click = self.spawn()
+
+            if click is not None:
+                self.supervise(click)
+
+            if self.stop_event.is_set():
+                break
+
+            # a process that ran for a while is not failing at startup
+            if time.time() - self.started >= STABLE_TIME:
+                failures = 0
+
+            backoff = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** failures)
+            failures += 1
+            self.restarts += 1
+
+            logging.info("restarting click %s process in %fs", self.mode,
+                                                               backoff)
+
+            self.stop_event.wait(backoff)
+
+    def stop(self):
+        """ Stop the click process, without restarting it. """
+
+        self.stop_event.set()
+
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def health(self):
+        """ Return the state of the click process. """
+
+        alive = self.process is not None and self.process.poll() is None
+
+        return {'mode' : self.mode,
+                'ready' : self.ready.is_set(),
+                'pid' : self.process.pid if alive else None,
+                'uptime' : time.time() - self.started if alive else 0.0,
+                'restarts' : self.restarts}
+
+    def read_ready(self):
+        """ Read ready handler. """
+        return "true" if self.ready.is_set() else "false"
+
+    def read_health(self):
+        """ Read health handler. """
+        return json.dumps(self.health(), sort_keys=True)
+
+def probe_ports(probes):
+    """ Return the UDP and TCP ports bound by the given probes, as two
+    dictionaries mapping each port to the probes using it. """
+
+    udp = {}
+    tcp = {}
+
+    for probe_id in sorted(probes):
+        probe = probes[probe_id]
+        udp.setdefault(probe['receiver_port'], []).append(probe_id)
+        tcp.setdefault(probe['receiver_control'], []).append(probe_id)
+        tcp.setdefault(probe['sender_control'], []).append(probe_id)
+
+    return udp, tcp
+
+def port_available(port, kind):
+    """ Check whether a port can be bound on all the interfaces. """
+
+    sock = socket.socket(socket.AF_INET, kind)
+
+    try:
+        if kind == socket.SOCK_STREAM:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', port))
+    except socket.error:
+        return False
+    finally:
+        sock.close()
 
-        logging.info("click %s process terminated with code %u", self.mode,
-                                                                 retval)
+    return True
+
+def check_ports(probes, health=None):
+    """ Raise a ValueError if the given probes, and the health port if
+    any, cannot run on this host together: a port is used twice or is
+    already taken. """
+
+    udp, tcp = probe_ports(probes)
+
+    if health is not None:
+        tcp.setdefault(health, []).append('health')
+
+    for kind, ports in ((socket.SOCK_DGRAM, udp), (socket.SOCK_STREAM, tcp)):
+
+        name = 'UDP' if kind == socket.SOCK_DGRAM else 'TCP'
+
+        for port in sorted(ports):
+
+            probe_ids = ports[port]
+
+            if len(probe_ids) > 1:
+                raise ValueError("%s port %u used more than once by %s" %
+                                 (name, port, ", ".join(probe_ids)))
+
+            if not port_available(port, kind):
+                raise ValueError("%s port %u of %s already in use" %
+                                 (name, port, probe_ids[0]))
+
+def start_probe(probe_id, probe, reactor, engine=DEFAULT_ENGINE):
+    """ Start the receiver and the sender of a probe, either click
+    instances, whose output is drained by reactor, or python engines, and
+    return them. """
+
+    logging.info("probe %s", probe_id)
+    logging.info("receiver ip address: %s", probe['receiver'])
+    logging.info("receiver port: %s", probe['receiver_port'])
+    logging.info("sender port: %s", probe['sender_port'])
+    logging.info("receiver control port: %u", probe['receiver_control'])
+    logging.info("sender control port: %u", probe['sender_control'])
+
+    if engine == 'python':
+
+        server = EngineReceiver(probe['receiver_port'],
+                                probe['receiver_control'],
+                                "receiver %s" % probe_id)
+        server.start()
+
+        client = EngineSender(probe['receiver'],
+                              probe['sender_port'],
+                              probe['sender_control'],
+                              "sender %s" % probe_id)
+        client.start()
+
+        return [server, client]
+
+    server = ClickDaemon(CLICK_RECEIVER % (probe['receiver_port'],
+                                          probe['receiver_control']),
+                         "receiver %s" % probe_id,
+                         probe['receiver_control'],
+                         reactor)
+    server.start()
+
+    client = ClickDaemon(CLICK_SENDER % (probe['receiver'],
+                                        probe['sender_port'],
+                                        probe['sender_control']),
+                         "sender %s" % probe_id,
+                         probe['sender_control'],
+                         reactor)
+    client.start()
+
+    return [server, client]
 
 def main():
     """ Launcher method. """
@@ -124,6 +364,31 @@ def main():
                       dest="probe",
                       default=None)
 
+    parser.add_option('--all', '-a',
+                      action="store_true",
+                      dest="all",
+                      default=False)
+
+    parser.add_option('--engine', '-e',
+                      type="choice",
+                      choices=['click', 'python'],
+                      dest="engine",
+                      default=DEFAULT_ENGINE)
+
+    parser.add_option('--log_rate',
+                      dest="log_rate",
+                      type="int",
+                      default=DEFAULT_LOG_RATE)
+
+    parser.add_option('--raw_log',
+                      dest="raw_log",
+                      default=None)
+
+    parser.add_option('--health',
+                      dest="health",
+                      type="int",
+                      default=None)
+
     parser.add_option('--verbose', '-v',
                       action="store_true",
                       dest="verbose",
@@ -145,38 +410,64 @@ def main():
 
     logging.info("starting eJOULE daemon")
 
-    if options.joule != None and options.probe != None:
-
-        logging.info("using probe profile %s", options.probe)
+    if options.joule != None and (options.probe != None or options.all):
 
         with open(os.path.expanduser(options.joule)) as data_file:
             joule = json.load(data_file)
 
-        receiver = joule['probes'][options.probe]['receiver']
-        sport = joule['probes'][options.probe]['sender_port']
-        rport = joule['probes'][options.probe]['receiver_port']
-        scontrol = joule['probes'][options.probe]['sender_control']
-        rcontrol = joule['probes'][options.probe]['receiver_control']
+        if options.all:
+            probe_ids = sorted(joule['probes'].keys())
+        else:
+            probe_ids = [x.strip() for x in options.probe.split(',')]
+
+        for probe_id in probe_ids:
+            if probe_id not in joule['probes']:
+                parser.error("no probe %s in %s" % (probe_id, options.joule))
+
+        logging.info("using probe profiles %s", ", ".join(probe_ids))
+
+        probes = dict((x, joule['probes'][x]) for x in probe_ids)
 
     else:
 
-        receiver = options.receiver
-        rport = options.rport
-        sport = options.sport
-        rcontrol = options.control
-        scontrol = options.control + 1
+        probes = {'cli' : {'receiver' : options.receiver,
+                           'receiver_port' : options.rport,
+                           'sender_port' : options.sport,
+                           'receiver_control' : options.control,
+                           'sender_control' : options.control + 1}}
 
-    logging.info("receiver ip address: %s", receiver)
-    logging.info("receiver port: %s", rport)
-    logging.info("sender port: %s", sport)
-    logging.info("receiver control port: %u", rcontrol)
-    logging.info("sender control port: %u", scontrol)
+    try:
+        check_ports(probes, options.health)
+    except ValueError as ex:
+        parser.error(str(ex))
 
-    server = ClickDaemon(CLICK_RECEIVER % (rport, rcontrol), "receiver")
-    server.start()
+    reactor = LogReactor(options.log_rate, options.raw_log)
+    reactor.start()
 
-    client = ClickDaemon(CLICK_SENDER % (receiver, sport, scontrol), "sender")
-    client.start()
+    daemons = {}
+
+    for probe_id in sorted(probes):
+        receiver, sender = start_probe(probe_id, probes[probe_id], reactor,
+                                       options.engine)
+        daemons['%s_receiver' % probe_id] = receiver
+        daemons['%s_sender' % probe_id] = sender
+
+    server = None
+    if options.health != None:
+        server = ControlServer(options.health, daemons, address='0.0.0.0')
+        server.start()
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("Bye!")
+
+    for daemon in daemons.values():
+        daemon.stop()
+
+    if server != None:
+        server.stop()
 
 if __name__ == "__main__":
     main()
@@ -58,6 +58,9 @@ def main():
 
     for stint in data['stints']:
 
+        if 'stats' not in stint:
+            continue
+
         probe_ids = (stint['src'], stint['dst'])
 
         if not probe_ids in pairs:
@@ -72,6 +72,9 @@ def main():
 
     for stint in data['stints']:
 
+        if 'stats' not in stint:
+            continue
+
         row = [stint['src'],
                stint['dst'],
                stint['bitrate_mbps'],
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Emulations of the click elements used by the Joule configurations: the
+RatedSource and Shaper of the sender, the Counter and TimeRange sinks and the
+AggregateCounter histograms polled by the Joule Virtual Meter. Sinks are
+updated lazily, advancing the sources feeding them whenever they are read,
+so callers must serialize the access to connected elements. They are shared
+by the mock click (see the mockclick module) and by the python engine (see
+the engine module).
+"""
+
+from controlserver import Element
+from clock import get_clock
+
+# account for ethernet (14), ip (20), and udp (8) headers
+HEADERS_LENGTH = 14 + 20 + 8
+
+def parse_bool(arg):
+    """ Parse a click boolean. """
+
+    value = arg.strip().lower()
+    if value in ('true', 'yes', '1'):
+        return True
+    if value in ('false', 'no', '0'):
+        return False
+    raise ValueError("expected boolean")
+
+class Sink(Element):
+    """ Base class for the elements downstream of a RatedSource. """
+
+    def __init__(self):
+        self.sources = []
+
+    def push(self, count, length, first, last):
+        """ Account for count packets of the given length, sent between
+        first and last. """
+        raise NotImplementedError()
+
+    def sync(self):
+        """ Bring the upstream sources up to date. """
+        for source in self.sources:
+            source.advance()
+
+class Counter(Sink):
+    """ Emulates a click Counter. """
+
+    def __init__(self):
+        super(Counter, self).__init__()
+        self.count = 0
+        self.byte_count = 0
+
+    def push(self, count, length, first, last):
+        self.count += count
+        self.byte_count += count * length
+
+    def read_count(self):
+        """ Read count handler. """
+        self.sync()
+        return self.count
+
+    def read_byte_count(self):
+        """ Read byte_count handler. """
+        self.sync()
+        return self.byte_count
+
+    def write_reset(self, _):
+        """ Write reset handler. """
+        self.sync()
+        self.count = 0
+        self.byte_count = 0
+
+class TimeRange(Sink):
+    """ Emulates a click TimeRange. """
+
+    def __init__(self):
+        super(TimeRange, self).__init__()
+        self.first = None
+        self.last = None
+
+    def push(self, count, length, first, last):
+        if self.first is None:
+            self.first = first
+        self.last = last
+
+    def read_first(self):
+        """ Read first handler. """
+        self.sync()
+        return "%.6f" % (self.first or 0.0)
+
+    def read_last(self):
+        """ Read last handler. """
+        self.sync()
+        return "%.6f" % (self.last or 0.0)
+
+    def read_interval(self):
+        """ Read interval handler. """
+        self.sync()
+        if self.first is None:
+            return "%.6f" % 0.0
+        return "%.6f" % (self.last - self.first)
+
+    def write_reset(self, _):
+        """ Write reset handler. """
+        self.sync()
+        self.first = None
+        self.last = None
+
+class AggCounter(Sink):
+    """ Emulates the packet length histogram polled by the virtual meter.
+    Lengths are recorded including the ethernet, ip and udp headers. """
+
+    def __init__(self):
+        super(AggCounter, self).__init__()
+        self.aggregates = {}
+
+    def push(self, count, length, first, last):
+        length = length + HEADERS_LENGTH
+        self.aggregates[length] = self.aggregates.get(length, 0) + count
+
+    def text(self):
+        """ Return the histogram in the write_text_file format. """
+        lines = ["!IPAggregate 1.0", "!num_nonzero %u" % len(self.aggregates)]
+        for length in sorted(self.aggregates):
+            lines.append("%u %u" % (length, self.aggregates[length]))
+        return "\n".join(lines) + "\n"
+
+    def read_count(self):
+        """ Read count handler. """
+        self.sync()
+        return sum(self.aggregates.values())
+
+    def read_nagg(self):
+        """ Read nagg handler. """
+        self.sync()
+        return len(self.aggregates)
+
+    def write_write_text_file(self, arg):
+        """ Write write_text_file handler. """
+        self.sync()
+        with open(arg.strip(), 'w') as text_file:
+            text_file.write(self.text())
+
+    def write_reset(self, _):
+        """ Write reset handler. """
+        self.sync()
+        self.aggregates = {}
+
+class Shaper(Element):
+    """ Emulates a click Shaper. A rate of 0 means unlimited. """
+
+    def __init__(self, source):
+        self.source = source
+        self.rate = 0
+
+    def read_rate(self):
+        """ Read rate handler. """
+        return self.rate
+
+    def write_rate(self, arg):
+        """ Write rate handler. """
+        self.source.rebase()
+        self.rate = int(arg)
+
+class RatedSource(Element):
+    """ Emulates a click RatedSource. Packets counted by the local sinks
+    leave the source at its own rate, packets reaching the remote sinks are
+    limited by the shaper until the source stops, the excess being dropped
+    by the queue in front of the shaper. """
+
+    def __init__(self):
+        self.rate = 10
+        self.length = 64
+        self.limit = -1
+        self.active = False
+        self.count = 0
+        self.shaper = Shaper(self)
+        self.local_sinks = []
+        self.remote_sinks = []
+        self._started = get_clock().time()
+        self._emitted = 0
+        self._delivered = 0
+
+    def _emit(self, sinks, done, rate, now):
+        """ Push to sinks the packets due at rate, return how many. """
+
+        if rate <= 0:
+            return 0
+
+        due = int((now - self._started) * rate) + 1
+
+        if self.limit >= 0:
+            due = min(due, self.limit - (self.count - self._emitted))
+
+        pending = due - done
+
+        if pending <= 0:
+            return 0
+
+        first = self._started + float(done) / rate
+        last = self._started + float(done + pending - 1) / rate
+
+        for sink in sinks:
+            sink.push(pending, self.length, first, last)
+
+        return pending
+
+    def advance(self):
+        """ Account for the packets sent since the last call. """
+
+        if not self.active:
+            return
+
+        now = get_clock().time()
+
+        shaped = self.rate
+        if self.shaper.rate > 0:
+            shaped = min(self.rate, self.shaper.rate)
+
+        emitted = self._emit(self.local_sinks, self._emitted, self.rate, now)
+        self._emitted += emitted
+        self.count += emitted
+
+        if self.limit >= 0 and self.count >= self.limit and self.rate > 0:
+            now = self._started + float(self._emitted) / self.rate
+
+        delivered = self._emit(self.remote_sinks, self._delivered, shaped, now)
+        self._delivered += delivered
+
+    def rebase(self):
+        """ Account for the packets sent so far and restart the schedule,
+        must be called before changing any traffic parameter. """
+
+        self.advance()
+        self._started = get_clock().time()
+        self._emitted = 0
+        self._delivered = 0
+
+    def read_rate(self):
+        """ Read rate handler. """
+        return self.rate
+
+    def write_rate(self, arg):
+        """ Write rate handler. """
+        self.rebase()
+        self.rate = int(arg)
+
+    def read_length(self):
+        """ Read length handler. """
+        return self.length
+
+    def write_length(self, arg):
+        """ Write length handler. """
+        self.rebase()
+        self.length = int(arg)
+
+    def read_limit(self):
+        """ Read limit handler. """
+        return self.limit
+
+    def write_limit(self, arg):
+        """ Write limit handler. """
+        self.rebase()
+        self.limit = int(arg)
+
+    def read_active(self):
+        """ Read active handler. """
+        return "true" if self.active else "false"
+
+    def write_active(self, arg):
+        """ Write active handler. """
+        self.rebase()
+        self.active = parse_bool(arg)
+
+    def read_count(self):
+        """ Read count handler. """
+        self.advance()
+        return self.count
+
+    def write_reset(self, _):
+        """ Write reset handler. """
+        self.rebase()
+        self.count = 0
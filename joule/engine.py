@@ -0,0 +1,527 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Engine. A pure Python replacement for the click configurations
+started by the Joule Daemon (see CLICK_SENDER and CLICK_RECEIVER), exposing
+the same ControlSocket handlers, so that probes can run on hosts without
+click. The sender reuses the RatedSource emulation of the elements module:
+a pacing thread advances the source every TICK seconds and sends the packets
+due in a tight loop over a preallocated payload, outside of the element
+lock. The receiver waits for the first datagram of a batch and then drains
+the socket without blocking, updating the counters once per batch.
+
+Besides the CBR flows of click, the sender supports other traffic patterns,
+set with the handlers of the 'pat' element:
+
+  pat.mode:         cbr, poisson, onoff or trace
+  pat.on, pat.off:  length in seconds of the ON and OFF periods (onoff)
+  pat.trace:        path of a packet trace on the probe (trace)
+  pat.seed:         seed of the random inter-departure times (poisson)
+
+Poisson and ON/OFF flows keep the mean rate set with src.rate, sending at
+src.rate * (on + off) / on during the ON periods. A packet trace is a text
+file with the departure time in seconds and the UDP payload length of one
+packet per line; it is replayed in a loop, src.rate and src.length are then
+ignored. In every mode src.limit bounds the packets sent and the queue in
+front of the shaper drops the packets in excess of sha.rate, as in click.
+"""
+
+import json
+import time
+import socket
+import select
+import random
+import logging
+import threading
+import collections
+
+from controlserver import Element, ControlServer
+from elements import Sink, Counter, TimeRange, RatedSource
+from clock import get_clock
+
+# largest UDP payload
+MAX_LENGTH = 65507
+
+# pacing period of the sender
+TICK = 0.001
+IDLE_TICK = 0.01
+
+# datagrams received per batch at most
+MAX_BATCH = 1024
+
+# seconds the receiver blocks waiting for a datagram
+RECV_TIMEOUT = 0.1
+
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+PATTERNS = ['cbr', 'poisson', 'onoff', 'trace']
+DEFAULT_ON = 0.1
+DEFAULT_OFF = 0.1
+
+# length of the queue in front of the shaper, see CLICK_SENDER
+QUEUE_LENGTH = 10
+
+def load_trace(path):
+    """ Load a packet trace, return a list of (offset, length) with the
+    offsets relative to the first packet. """
+
+    packets = []
+
+    with open(path) as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            packets.append((float(fields[0]), int(fields[1])))
+
+    if not packets:
+        raise ValueError("empty trace %s" % path)
+
+    start = packets[0][0]
+    return [(offset - start, length) for offset, length in packets]
+
+class Pattern(Element):
+    """ Traffic pattern of a PatternSource. """
+
+    def __init__(self, source):
+        self.source = source
+        self.mode = 'cbr'
+        self.on = DEFAULT_ON
+        self.off = DEFAULT_OFF
+        self.trace = None
+        self.packets = []
+        self.random = random.Random()
+
+    def departures(self, rate, length):
+        """ Generate the (offset, length) of the packets, the offsets are
+        relative to the start of the schedule. Poisson and ON/OFF flows send
+        nothing at a rate of 0. """
+
+        if self.mode in ('poisson', 'onoff') and rate <= 0:
+            return
+
+        if self.mode == 'poisson':
+
+            offset = 0.0
+            while True:
+                offset += self.random.expovariate(rate)
+                yield offset, length
+
+        elif self.mode == 'onoff':
+
+            # the fraction of a packet left by a burst goes to the next one,
+            # so that the mean rate holds even below one packet per cycle
+            period = self.on + self.off
+            peak = rate * period / self.on
+            credit = 0.0
+            cycle = 0
+            while True:
+                credit += rate * period
+                burst = int(credit)
+                credit -= burst
+                for i in range(0, burst):
+                    yield cycle * period + i / peak, length
+                cycle += 1
+
+        elif self.mode == 'trace':
+
+            packets = self.packets
+            gap = packets[-1][0] / max(1, len(packets) - 1) or 1.0
+            period = packets[-1][0] + gap
+            cycle = 0
+            while True:
+                for offset, size in packets:
+                    yield cycle * period + offset, size
+                cycle += 1
+
+    def read_mode(self):
+        """ Read mode handler. """
+        return self.mode
+
+    def write_mode(self, arg):
+        """ Write mode handler. """
+        mode = arg.strip().lower()
+        if mode not in PATTERNS:
+            raise ValueError("expected one of %s" % ", ".join(PATTERNS))
+        if mode == 'trace' and not self.packets:
+            raise ValueError("no trace loaded")
+        self.source.rebase()
+        self.mode = mode
+
+    def read_on(self):
+        """ Read on handler. """
+        return self.on
+
+    def write_on(self, arg):
+        """ Write on handler. """
+        if float(arg) <= 0:
+            raise ValueError("expected positive duration")
+        self.source.rebase()
+        self.on = float(arg)
+
+    def read_off(self):
+        """ Read off handler. """
+        return self.off
+
+    def write_off(self, arg):
+        """ Write off handler. """
+        if float(arg) < 0:
+            raise ValueError("expected non negative duration")
+        self.source.rebase()
+        self.off = float(arg)
+
+    def read_trace(self):
+        """ Read trace handler. """
+        return self.trace or ""
+
+    def write_trace(self, arg):
+        """ Write trace handler. """
+        try:
+            packets = load_trace(arg.strip())
+        except (IOError, OSError) as ex:
+            raise ValueError(str(ex))
+        self.source.rebase()
+        self.trace = arg.strip()
+        self.packets = packets
+
+    def write_seed(self, arg):
+        """ Write seed handler. """
+        self.source.rebase()
+        self.random.seed(int(arg))
+
+class PatternSource(RatedSource):
+    """ A RatedSource following a Pattern. In CBR mode it behaves as the
+    RatedSource, in the other modes packets are generated one at a time at
+    their departure times and go through the queue and the shaper. """
+
+    def __init__(self):
+        super(PatternSource, self).__init__()
+        self.pattern = Pattern(self)
+        self._departures = None
+        self._next = None
+        self._queue = collections.deque()
+        self._shaped = 0.0
+
+    def rebase(self):
+        super(PatternSource, self).rebase()
+        self._departures = None
+        self._next = None
+        self._queue.clear()
+        self._shaped = 0.0
+
+    def next_event(self):
+        """ Return the time of the next departure from the source or from
+        the shaper, None in CBR mode or when nothing is scheduled. """
+
+        if self.pattern.mode == 'cbr' or not self.active:
+            return None
+
+        times = [x[0] for x in list(self._queue)[0:1]]
+
+        if self._next is not None and \
+           (self.limit < 0 or self.count < self.limit):
+            times.append(self._started + self._next[0])
+
+        return min(times) if times else None
+
+    def _release(self, now, delivered):
+        """ Move the packets leaving the shaper by now to delivered. """
+
+        while self._queue and self._queue[0][0] <= now:
+            departure, length = self._queue.popleft()
+            delivered.append((departure, length))
+
+    def _enqueue(self, arrival, length, delivered):
+        """ Queue a packet in front of the shaper, dropping it if the
+        queue is full. """
+
+        self._release(arrival, delivered)
+
+        if self.shaper.rate <= 0:
+            delivered.append((arrival, length))
+            return
+
+        if len(self._queue) >= QUEUE_LENGTH:
+            return
+
+        departure = max(arrival, self._shaped)
+        self._shaped = departure + 1.0 / self.shaper.rate
+        self._queue.append((departure, length))
+
+    def advance(self):
+
+        if self.pattern.mode == 'cbr':
+            super(PatternSource, self).advance()
+            return
+
+        if not self.active:
+            return
+
+        now = get_clock().time()
+
+        if self._departures is None:
+            self._departures = self.pattern.departures(self.rate,
+                                                       self.length)
+            self._next = next(self._departures, None)
+            self._shaped = self._started
+
+        emitted = []
+        delivered = []
+
+        while self._next is not None and self._started + self._next[0] <= now:
+
+            if self.limit >= 0 and self.count >= self.limit:
+                break
+
+            departure = self._started + self._next[0]
+            length = self._next[1]
+
+            self.count += 1
+            emitted.append((departure, length))
+            self._enqueue(departure, length, delivered)
+
+            self._next = next(self._departures, None)
+
+        self._release(now, delivered)
+
+        for sinks, packets in ((self.local_sinks, emitted),
+                               (self.remote_sinks, delivered)):
+            for departure, length in packets:
+                for sink in sinks:
+                    sink.push(1, length, departure, departure)
+
+class SocketSink(Sink):
+    """ Queue the packets pushed by a RatedSource, to be sent by the
+    engine thread. """
+
+    def __init__(self):
+        super(SocketSink, self).__init__()
+        self.batches = []
+
+    def push(self, count, length, first, last):
+        if self.batches and self.batches[-1][0] == length:
+            self.batches[-1][1] += count
+        else:
+            self.batches.append([length, count])
+
+    def take(self):
+        """ Return and clear the queued (length, count) batches. """
+
+        batches = self.batches
+        self.batches = []
+        return batches
+
+class Engine(Element):
+    """ Base class for the engines: a ControlServer exposing the engine
+    elements and a thread moving the packets. """
+
+    def __init__(self, mode, control, elements):
+
+        self.mode = mode
+        self.control = control
+        self.server = ControlServer(control, elements, address='0.0.0.0')
+        self.lock = self.server.lock
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.started = None
+
+    def run(self):
+        """ Move packets until stopped. """
+        raise NotImplementedError()
+
+    def start(self):
+        """ Start the engine. """
+
+        logging.info("starting python %s engine on port %u", self.mode,
+                                                            self.control)
+        self.started = time.time()
+        self.server.start()
+        self.thread.start()
+
+    def stop(self):
+        """ Stop the engine. """
+
+        self.stop_event.set()
+        self.thread.join()
+        self.server.stop()
+
+    def health(self):
+        """ Return the state of the engine. """
+
+        return {'mode' : self.mode,
+                'ready' : self.thread.is_alive(),
+                'pid' : None,
+                'uptime' : time.time() - self.started,
+                'restarts' : 0}
+
+    def read_ready(self):
+        """ Read ready handler. """
+        return "true" if self.thread.is_alive() else "false"
+
+    def read_health(self):
+        """ Read health handler. """
+        return json.dumps(self.health(), sort_keys=True)
+
+class EngineSender(Engine):
+    """ UDP CBR sender, see CLICK_SENDER. """
+
+    def __init__(self, receiver, port, control, mode="sender"):
+
+        self.src = PatternSource()
+        self.counter_client = Counter()
+        self.tr_client = TimeRange()
+        self.sink = SocketSink()
+
+        self.counter_client.sources.append(self.src)
+        self.tr_client.sources.append(self.src)
+        self.src.local_sinks.extend([self.counter_client, self.tr_client])
+        self.src.remote_sinks.append(self.sink)
+
+        super(EngineSender, self).__init__(mode, control,
+                                           {'src' : self.src,
+                                            'sha' : self.src.shaper,
+                                            'pat' : self.src.pattern,
+                                            'counter_client' :
+                                                self.counter_client,
+                                            'tr_client' : self.tr_client})
+
+        self.destination = (receiver, port)
+        self.payload = memoryview(bytearray(MAX_LENGTH))
+        self.sent = 0
+        self.dropped = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                             SOCKET_BUFFER)
+
+    def send(self, length, count):
+        """ Send count datagrams of the given length. """
+
+        payload = self.payload[0:min(length, MAX_LENGTH)]
+        sendto = self.sock.sendto
+        destination = self.destination
+
+        for _ in range(0, count):
+            try:
+                sendto(payload, destination)
+            except socket.error:
+                self.dropped += 1
+            else:
+                self.sent += 1
+
+    def run(self):
+
+        while not self.stop_event.is_set():
+
+            with self.lock:
+                try:
+                    self.src.advance()
+                except Exception:
+                    # a bad handler value stops the flow, not the probe
+                    logging.exception("%s: stopping the source", self.mode)
+                    self.src.active = False
+                active = self.src.active
+                batches = self.sink.take()
+                wake = self.src.next_event()
+
+            for length, count in batches:
+                self.send(length, count)
+
+            # patterns are paced packet by packet, cbr flows every tick
+            if wake is not None:
+                delay = min(IDLE_TICK, wake - time.time())
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                time.sleep(TICK if active else IDLE_TICK)
+
+        self.sock.close()
+
+class EngineReceiver(Engine):
+    """ UDP sink, see CLICK_RECEIVER. """
+
+    def __init__(self, port, control, mode="receiver"):
+
+        self.counter_server = Counter()
+        self.tr_server = TimeRange()
+
+        super(EngineReceiver, self).__init__(mode, control,
+                                             {'counter_server' :
+                                                  self.counter_server,
+                                              'tr_server' : self.tr_server})
+
+        self.buf = bytearray(MAX_LENGTH)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                             SOCKET_BUFFER)
+        self.sock.bind(('0.0.0.0', port))
+        self.sock.setblocking(False)
+
+    def receive(self):
+        """ Receive a batch of datagrams, return their count, their total
+        length and the arrival time of the first and of the last one. """
+
+        readable, _, _ = select.select([self.sock], [], [], RECV_TIMEOUT)
+
+        if not readable:
+            return 0, 0, None, None
+
+        recv_into = self.sock.recv_into
+        buf = self.buf
+
+        first = time.time()
+        count = 0
+        length = 0
+
+        while count < MAX_BATCH:
+            try:
+                length += recv_into(buf)
+            except socket.error:
+                break
+            count += 1
+
+        return count, length, first, time.time()
+
+    def run(self):
+
+        while not self.stop_event.is_set():
+
+            count, length, first, last = self.receive()
+
+            if count == 0:
+                continue
+
+            with self.lock:
+                self.counter_server.count += count
+                self.counter_server.byte_count += length
+                self.tr_server.push(count, 0, first, last)
+
+        self.sock.close()
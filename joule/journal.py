@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Journal. Results are appended to the journal as soon as they are
+available, one compact JSON document per line, and synced to disk, so that
+an interrupted campaign can be resumed from the last completed stint. A
+truncated last line, left by a crash during a write, is ignored.
+"""
+
+import os
+import json
+import logging
+import threading
+
+JOURNAL_SUFFIX = '.journal'
+
+class Journal(object):
+    """ Append-only journal of results. """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.journal_file = None
+
+    def load(self):
+        """ Return the entries saved in the journal. """
+
+        entries = []
+
+        if not os.path.exists(self.path):
+            return entries
+
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logging.warning("skipping corrupted journal entry")
+
+        return entries
+
+    def open(self, resume=False):
+        """ Open the journal, appending to it when resuming a campaign. """
+
+        if not resume:
+            self.journal_file = open(self.path, 'w')
+            return
+
+        self.journal_file = open(self.path, 'a+')
+
+        # terminate a truncated last line, so that it does not corrupt the
+        # next entry
+        self.journal_file.seek(0, os.SEEK_END)
+
+        if self.journal_file.tell() > 0:
+            self.journal_file.seek(self.journal_file.tell() - 1)
+            if self.journal_file.read(1) != '\n':
+                self.journal_file.write('\n')
+
+    def append(self, entry):
+        """ Append an entry and sync it to disk. """
+
+        line = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+
+        with self.lock:
+            self.journal_file.write(line + '\n')
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+
+    def close(self):
+        """ Close the journal. """
+
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+def write_atomically(path, data):
+    """ Write data as JSON to path. The file is written aside and then
+    renamed, so path always holds either the old or the new content. """
+
+    tmp = path + '.tmp'
+
+    with open(tmp, 'w') as data_file:
+        json.dump(data,
+                  data_file,
+                  sort_keys=True,
+                  indent=4,
+                  separators=(',', ': '))
+        data_file.flush()
+        os.fsync(data_file.fileno())
+
+    os.rename(tmp, path)
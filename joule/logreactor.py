@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Log Reactor. A single thread draining the output of any number of
+child processes: pipes are made non-blocking and multiplexed with select, so
+a chatty click instance neither costs a thread nor blocks on a full pipe.
+Lines are logged at debug level, prefixed by the name of their process.
+Repeated lines are aggregated into a single 'last message repeated' entry
+and each process is limited to a number of lines per second, the lines in
+excess being counted and reported once per flush interval. The raw output
+of all the processes can also be written to a rotating log file.
+"""
+
+import os
+import time
+import errno
+import fcntl
+import select
+import logging
+import threading
+import logging.handlers
+
+# lines per second logged for each process
+DEFAULT_RATE = 50
+
+# seconds between reports of the suppressed lines
+FLUSH_INTERVAL = 1.0
+
+READ_SIZE = 65536
+
+RAW_LOG_BYTES = 10 * 1024 * 1024
+RAW_LOG_BACKUPS = 5
+
+LOG_FORMAT = '%(asctime)-15s %(message)s'
+
+def set_nonblocking(fd):
+    """ Put a file descriptor in non-blocking mode. """
+
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+class Stream(object):
+    """ The output of a process being drained. """
+
+    def __init__(self, name, pipe, rate):
+        self.name = name
+        self.pipe = pipe
+        self.partial = b''
+        self.last = None
+        self.repeats = 0
+        self.suppressed = 0
+        self.rate = rate
+        self.tokens = float(rate)
+        self.stamp = time.time()
+
+class LogReactor(threading.Thread):
+    """ Drain the registered pipes, see the module documentation. """
+
+    def __init__(self, rate=DEFAULT_RATE, raw=None):
+
+        super(LogReactor, self).__init__()
+        self.daemon = True
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.flushed = time.time()
+
+        self.wake_r, self.wake_w = os.pipe()
+        set_nonblocking(self.wake_r)
+        set_nonblocking(self.wake_w)
+
+        self.raw = None
+
+        if raw is not None:
+            handler = logging.handlers.RotatingFileHandler(
+                raw, maxBytes=RAW_LOG_BYTES, backupCount=RAW_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            self.raw = logging.getLogger('joule.raw')
+            self.raw.setLevel(logging.DEBUG)
+            self.raw.propagate = False
+            self.raw.addHandler(handler)
+
+    def register(self, pipe, name):
+        """ Drain the output of a process from pipe, closing it on EOF. """
+
+        fd = pipe.fileno()
+        set_nonblocking(fd)
+
+        with self.lock:
+            self.streams[fd] = Stream(name, pipe, self.rate)
+
+        self.wake()
+
+    def wake(self):
+        """ Interrupt the select call, e.g. to watch a new pipe. """
+
+        try:
+            os.write(self.wake_w, b'x')
+        except OSError as ex:
+            if ex.errno != errno.EAGAIN:
+                raise
+
+    def run(self):
+
+        while True:
+
+            with self.lock:
+                fds = list(self.streams.keys())
+
+            readable, _, _ = select.select(fds + [self.wake_r], [], [],
+                                           FLUSH_INTERVAL)
+
+            for fd in readable:
+
+                if fd == self.wake_r:
+                    self.drain_wake()
+                else:
+                    self.read(fd)
+
+            now = time.time()
+
+            if now - self.flushed >= FLUSH_INTERVAL:
+                self.flush()
+                self.flushed = now
+
+    def drain_wake(self):
+        """ Consume the wake up bytes. """
+
+        try:
+            while os.read(self.wake_r, READ_SIZE):
+                pass
+        except OSError as ex:
+            if ex.errno != errno.EAGAIN:
+                raise
+
+    def read(self, fd):
+        """ Read what is available on a pipe. """
+
+        stream = self.streams[fd]
+
+        try:
+            data = os.read(fd, READ_SIZE)
+        except OSError as ex:
+            if ex.errno == errno.EAGAIN:
+                return
+            data = b''
+
+        if not data:
+            self.close(fd)
+            return
+
+        lines = (stream.partial + data).split(b'\n')
+        stream.partial = lines.pop()
+
+        for line in lines:
+            self.line(stream, line.decode('latin-1').rstrip('\r'))
+
+    def line(self, stream, line):
+        """ Handle a line of output. """
+
+        if self.raw is not None:
+            self.raw.debug("%s: %s", stream.name, line)
+
+        if line == stream.last:
+            stream.repeats += 1
+            return
+
+        self.summarize(stream)
+        stream.last = line
+
+        now = time.time()
+        stream.tokens = min(stream.rate,
+                            stream.tokens + (now - stream.stamp) * stream.rate)
+        stream.stamp = now
+
+        if stream.tokens < 1:
+            stream.suppressed += 1
+            return
+
+        stream.tokens -= 1
+        logging.debug("%s: %s", stream.name, line)
+
+    def summarize(self, stream):
+        """ Log the repetitions of the last line, if any. """
+
+        if stream.repeats:
+            logging.debug("%s: last message repeated %u times", stream.name,
+                                                               stream.repeats)
+            stream.repeats = 0
+
+    def report(self, stream):
+        """ Log the number of lines suppressed, if any. """
+
+        if stream.suppressed:
+            logging.debug("%s: %u lines suppressed", stream.name,
+                                                    stream.suppressed)
+            stream.suppressed = 0
+
+    def flush(self):
+        """ Report the repetitions and the lines suppressed so far. """
+
+        with self.lock:
+            streams = list(self.streams.values())
+
+        for stream in streams:
+            self.summarize(stream)
+            self.report(stream)
+
+    def close(self, fd):
+        """ Stop draining a pipe at EOF. """
+
+        with self.lock:
+            stream = self.streams.pop(fd)
+
+        if stream.partial:
+            self.line(stream, stream.partial.decode('latin-1'))
+
+        self.summarize(stream)
+        self.report(stream)
+        stream.pipe.close()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Mock Click. It emulates, in process, the click configurations
+started by the Joule Daemon (see CLICK_SENDER and CLICK_RECEIVER) and the
+RX/TX aggregates polled by the Joule Virtual Meter, so that the profiler and
+the virtual meter can be exercised and benchmarked without a click binary.
+Traffic is not actually generated: packet counters and time ranges are
+advanced according to the configured rate whenever they are accessed. Each
+ControlSocket reply can be delayed in order to emulate a remote probe.
+
+Command Line Arguments:
+
+  --joule, -j:      joule descriptor, all the probes are emulated
+  --latency, -t:    delay of each ControlSocket reply in ms, e.g. 2
+  --monitor, -m:    control port of the RX/TX aggregates, e.g. 5555
+"""
+
+import os
+import json
+import time
+import optparse
+import logging
+import threading
+
+from controlserver import ControlServer
+from elements import Counter, TimeRange, AggCounter, RatedSource
+
+DEFAULT_JOULE = './joule.json'
+DEFAULT_LATENCY = 0.0
+
+LOG_FORMAT = '%(asctime)-15s %(message)s'
+
+class MockMonitor(object):
+    """ Emulates the click instance polled by the virtual meter, exposing
+    the RX and TX packet length histograms. """
+
+    def __init__(self, port, latency=DEFAULT_LATENCY):
+
+        self.rx = AggCounter()
+        self.tx = AggCounter()
+        self.server = ControlServer(port, {'RX': self.rx, 'TX': self.tx},
+                                    latency=latency)
+
+    def start(self):
+        """ Start the control socket. """
+        self.server.start()
+
+    def stop(self):
+        """ Stop the control socket. """
+        self.server.stop()
+
+class MockProbe(object):
+    """ Emulates the sender and receiver click instances of a probe. """
+
+    def __init__(self, receiver_control, sender_control,
+                 latency=DEFAULT_LATENCY, monitor=None, lock=None):
+
+        self.monitor = monitor
+
+        self.src = RatedSource()
+        self.counter_client = Counter()
+        self.tr_client = TimeRange()
+        self.counter_server = Counter()
+        self.tr_server = TimeRange()
+
+        self.counter_client.sources.append(self.src)
+        self.tr_client.sources.append(self.src)
+        self.src.local_sinks.extend([self.counter_client, self.tr_client])
+
+        if monitor is not None:
+            monitor.tx.sources.append(self.src)
+            self.src.remote_sinks.append(monitor.tx)
+
+        self.sender = ControlServer(sender_control,
+                                    {'src' : self.src,
+                                     'sha' : self.src.shaper,
+                                     'counter_client' : self.counter_client,
+                                     'tr_client' : self.tr_client},
+                                    latency=latency)
+
+        self.receiver = ControlServer(receiver_control,
+                                      {'counter_server' : self.counter_server,
+                                       'tr_server' : self.tr_server},
+                                      latency=latency)
+
+        # sinks are updated lazily, advancing the sources of other probes
+        if lock is not None:
+            self.sender.lock = lock
+        self.receiver.lock = self.sender.lock
+
+    def connect(self, peer):
+        """ Deliver the traffic generated by this probe to peer. """
+
+        sinks = [peer.counter_server, peer.tr_server]
+
+        if peer.monitor is not None:
+            sinks.append(peer.monitor.rx)
+
+        for sink in sinks:
+            sink.sources.append(self.src)
+
+        self.src.remote_sinks.extend(sinks)
+
+    def start(self):
+        """ Start the control sockets. """
+        self.receiver.start()
+        self.sender.start()
+
+    def stop(self):
+        """ Stop the control sockets. """
+        self.sender.stop()
+        self.receiver.stop()
+
+def mock_testbed(joule, latency=DEFAULT_LATENCY, monitor=None):
+    """ Build a MockProbe for every probe in the Joule descriptor and
+    connect each sender to the probe listening on its sender port. Reading
+    a sink advances the sources feeding it, so all the control sockets of
+    the testbed, monitor included, share a single lock. """
+
+    lock = threading.RLock()
+
+    if monitor is not None:
+        monitor.server.lock = lock
+
+    probes = {}
+
+    for probe_id, probe in joule['probes'].items():
+        probes[probe_id] = MockProbe(probe['receiver_control'],
+                                     probe['sender_control'],
+                                     latency,
+                                     monitor,
+                                     lock)
+
+    for probe_id, probe in joule['probes'].items():
+        for peer_id, peer in joule['probes'].items():
+            if probe['sender_port'] == peer['receiver_port']:
+                probes[probe_id].connect(probes[peer_id])
+
+    return probes
+
+def main():
+    """ Launcher method. """
+
+    parser = optparse.OptionParser()
+
+    parser.add_option('--joule', '-j',
+                      dest="joule",
+                      default=DEFAULT_JOULE)
+
+    parser.add_option('--latency', '-t',
+                      dest="latency",
+                      type="float",
+                      default=DEFAULT_LATENCY)
+
+    parser.add_option('--monitor', '-m',
+                      dest="monitor",
+                      type="int",
+                      default=None)
+
+    parser.add_option('--verbose', '-v',
+                      action="store_true",
+                      dest="verbose",
+                      default=False)
+
+    parser.add_option('--log', '-l', dest="log")
+
+    options, _ = parser.parse_args()
+
+    if options.verbose:
+        lvl = logging.DEBUG
+    else:
+        lvl = logging.INFO
+
+    logging.basicConfig(level=lvl,
+                        format=LOG_FORMAT,
+                        filename=options.log,
+                        filemode='w')
+
+    with open(os.path.expanduser(options.joule)) as data_file:
+        joule = json.load(data_file)
+
+    logging.info("starting Joule Mock Click")
+
+    latency = options.latency / 1000
+
+    monitor = None
+    if options.monitor != None:
+        monitor = MockMonitor(options.monitor, latency)
+        monitor.start()
+
+    probes = mock_testbed(joule, latency, monitor)
+
+    for probe in probes.values():
+        probe.start()
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("Bye!")
+
+    for probe in probes.values():
+        probe.stop()
+
+    if monitor != None:
+        monitor.stop()
+
+if __name__ == "__main__":
+    main()
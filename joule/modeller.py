@@ -97,6 +97,10 @@ def main():
 
     for stint in data['stints']:
 
+        # stints without results (skipped or failed)
+        if 'stats' not in stint:
+            continue
+
         row = [stint['src'],
                stint['dst'],
                stint['bitrate_mbps'],
@@ -170,8 +174,15 @@ def main():
 
             rates = conn.cursor().execute(sql).fetchall()
 
-            slope = ((rates[len(rates) - 1][1] - rates[0][1]) /
-                     (rates[len(rates) - 1][0] - rates[0][0]))
+            if not rates:
+                continue
+
+            if rates[len(rates) - 1][0] == rates[0][0]:
+                # a single rate below x_max, the idle power is the intercept
+                slope = ((rates[0][1] - models['gamma']) / rates[0][0])
+            else:
+                slope = ((rates[len(rates) - 1][1] - rates[0][1]) /
+                         (rates[len(rates) - 1][0] - rates[0][0]))
 
             slopes.append([size[0], slope])
 
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Planner. The planner reads a Joule descriptor and estimates how
+long the profiler will take to run it, without touching the probes or the
+power meter. For every stint it reports the packets to be sent, the packets
+the medium can carry in the stint duration (see the airtime module) and
+flags the stints whose bitrate exceeds the maximum theoretical goodput:
+such stints saturate at the same x_max, only one of them per direction and
+packet size is needed by the modeller. The time of a stint is its duration
+plus the ControlSocket round trips of the control loop and the settle wait
+after it. Stints that do not conflict are run at the same time, as in the
+profiler. The handler latency is taken, in order, from --latency, from the
+probes with --measure or from the 'timings' saved in the descriptor by a
+previous run. The report is printed to the standard output.
+
+Command Line Arguments:
+
+  --joule, -j:      joule descriptor, e.g. ~/joule.json
+  --hwmode, -m:     the hardware mode, e.g. 11a
+  --channel, -c:    the channel width in MHz, e.g. 20
+  --streams, -s:    the number of spatial streams, e.g. 1
+  --latency, -t:    handler round-trip time in ms, e.g. 2
+  --measure:        measure the handler latency on the probes
+  --settle:         expected settle wait in seconds, e.g. 1
+  --order, -o:      stint order, descriptor or optimized
+"""
+
+import os
+import json
+import time
+import socket
+import optparse
+import logging
+
+from click import read_handler
+from airtime import max_tps, max_goodput_bps
+from scheduler import schedule_rounds, order_stints
+from profiler import DEFAULT_HWMODE, DEFAULT_CHANNEL, DEFAULT_STREAMS
+from profiler import DEFAULT_SETTLE_MAX, SETTLE_WINDOW
+
+DEFAULT_JOULE = './joule.json'
+
+# a stint settles in two windows at best
+DEFAULT_SETTLE = 2 * SETTLE_WINDOW
+
+# handler round trips per stint: reset, configure, start, stop and status
+ROUND_TRIPS = 5
+
+# READ handlers timed on each control port with --measure
+MEASURE_SAMPLES = 10
+
+LOG_FORMAT = '%(asctime)-15s %(message)s'
+
+def measure_latency(data, samples=MEASURE_SAMPLES):
+    """ Return the mean round-trip time of a READ handler over the control
+    ports of all the probes, or None if no probe answers. The first read on
+    each port opens the session and is not timed. """
+
+    rtts = []
+
+    for probe in data['probes'].values():
+
+        for port in (probe['sender_control'], probe['receiver_control']):
+
+            try:
+
+                if read_handler(probe['ip'], port, 'version') is None:
+                    continue
+
+                for _ in range(0, samples):
+                    start = time.time()
+                    read_handler(probe['ip'], port, 'version')
+                    rtts.append(time.time() - start)
+
+            except socket.error as ex:
+                logging.warning("unable to reach %s:%u (%s)", probe['ip'],
+                                port, ex)
+
+    if not rtts:
+        return None
+
+    return sum(rtts) / len(rtts)
+
+def handler_latency(data, options):
+    """ Return the handler latency in seconds and where it comes from. """
+
+    if options.latency is not None:
+        return options.latency / 1000, "command line"
+
+    if options.measure:
+        latency = measure_latency(data)
+        if latency is not None:
+            return latency, "measured"
+
+    if 'handlers' in data.get('timings', {}):
+        return data['timings']['handlers']['mean'], "previous run"
+
+    return 0.0, "unknown"
+
+def plan_stint(stint, options):
+    """ Return the packets sent by a stint, the packets the medium can carry
+    and whether the stint saturates the medium. """
+
+    size = stint['packetsize_bytes']
+
+    packet_rate = int(float(stint['bitrate_mbps'] * 1000000) / (size * 8))
+    sent = int(packet_rate * stint['duration_s'])
+
+    tps = float(max_tps(options.hwmode, options.channel, options.streams,
+                        size))
+    goodput = float(max_goodput_bps(options.hwmode, options.channel,
+                                    options.streams, size))
+
+    carried = min(sent, int(tps * stint['duration_s']))
+    saturated = stint['bitrate_mbps'] * 1000000 > goodput
+
+    return sent, carried, saturated
+
+def plan(data, options):
+    """ Estimate the campaign, return a dictionary with the plan of every
+    stint and the totals. """
+
+    latency, source = handler_latency(data, options)
+
+    overhead = ROUND_TRIPS * latency + options.settle
+
+    indexes = list(range(0, len(data['stints'])))
+
+    if options.order == 'optimized':
+        indexes = order_stints(data, indexes)
+
+    stints = []
+    seen = set()
+    redundant = 0
+    wasted = 0.0
+
+    for i in indexes:
+
+        stint = data['stints'][i]
+        sent, carried, saturated = plan_stint(stint, options)
+
+        key = (stint['src'], stint['dst'], stint['packetsize_bytes'])
+
+        if saturated and key in seen:
+            redundant += 1
+            wasted += stint['duration_s'] + overhead
+
+        if saturated:
+            seen.add(key)
+
+        stints.append({'index' : i,
+                       'sent' : sent,
+                       'carried' : carried,
+                       'saturated' : saturated})
+
+    total = data['idle']['duration_s'] + options.settle
+    worst = data['idle']['duration_s'] + DEFAULT_SETTLE_MAX
+
+    rounds = schedule_rounds(data, indexes)
+
+    for round_indexes in rounds:
+        longest = max(data['stints'][i]['duration_s'] for i in round_indexes)
+        total += longest + overhead
+        worst += longest + ROUND_TRIPS * latency + DEFAULT_SETTLE_MAX
+
+    return {'stints' : stints,
+            'rounds' : len(rounds),
+            'latency' : latency,
+            'latency_source' : source,
+            'total_s' : total,
+            'worst_s' : worst,
+            'redundant' : redundant,
+            'wasted_s' : wasted}
+
+def hms(seconds):
+    """ Format seconds as h:mm:ss. """
+
+    seconds = int(round(seconds))
+    return "%u:%02u:%02u" % (seconds // 3600, seconds // 60 % 60,
+                             seconds % 60)
+
+def main():
+    """ Launcher method. """
+
+    parser = optparse.OptionParser()
+
+    parser.add_option('--joule', '-j',
+                      dest="joule",
+                      default=DEFAULT_JOULE)
+
+    parser.add_option('--hwmode', '-m',
+                      dest="hwmode",
+                      default=DEFAULT_HWMODE)
+
+    parser.add_option('--channel', '-c',
+                      dest="channel",
+                      default=DEFAULT_CHANNEL)
+
+    parser.add_option('--streams', '-s',
+                      type="int",
+                      dest="streams",
+                      default=DEFAULT_STREAMS)
+
+    parser.add_option('--latency', '-t',
+                      type="float",
+                      dest="latency",
+                      default=None)
+
+    parser.add_option('--measure',
+                      action="store_true",
+                      dest="measure",
+                      default=False)
+
+    parser.add_option('--settle',
+                      type="float",
+                      dest="settle",
+                      default=DEFAULT_SETTLE)
+
+    parser.add_option('--order', '-o',
+                      type="choice",
+                      choices=['descriptor', 'optimized'],
+                      dest="order",
+                      default='descriptor')
+
+    parser.add_option('--verbose', '-v',
+                      action="store_true",
+                      dest="verbose",
+                      default=False)
+
+    parser.add_option('--log', '-l', dest="log")
+
+    options, _ = parser.parse_args()
+
+    if options.verbose:
+        lvl = logging.DEBUG
+    else:
+        lvl = logging.INFO
+
+    logging.basicConfig(level=lvl,
+                        format=LOG_FORMAT,
+                        filename=options.log,
+                        filemode='w')
+
+    with open(os.path.expanduser(options.joule)) as data_file:
+        data = json.load(data_file)
+
+    result = plan(data, options)
+
+    print("# index, src, dst, bitrate, length, duration, sent, carried, "
+          "saturated")
+
+    for entry in result['stints']:
+        stint = data['stints'][entry['index']]
+        print("%u;%s;%s;%f;%u;%u;%u;%u;%s" % (entry['index'],
+                                              stint['src'],
+                                              stint['dst'],
+                                              stint['bitrate_mbps'],
+                                              stint['packetsize_bytes'],
+                                              stint['duration_s'],
+                                              entry['sent'],
+                                              entry['carried'],
+                                              entry['saturated']))
+
+    saturated = len([x for x in result['stints'] if x['saturated']])
+
+    print("# medium: %s, %s MHz, %u stream(s)" % (options.hwmode,
+                                                  options.channel,
+                                                  options.streams))
+    print("# stints: %u in %u rounds" % (len(data['stints']),
+                                         result['rounds']))
+    print("# handler latency: %f ms (%s)" % (result['latency'] * 1000,
+                                             result['latency_source']))
+    print("# saturated stints: %u, redundant: %u (%s)" %
+          (saturated, result['redundant'], hms(result['wasted_s'])))
+    print("# estimated time: %s, at most %s" % (hms(result['total_s']),
+                                                hms(result['worst_s'])))
+
+if __name__ == "__main__":
+    main()
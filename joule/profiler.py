@@ -31,26 +31,37 @@ the probes available on the network and the stints to be executed. The output
 is written in the original Joule descriptor and includes the total number of
 packet TX/RX, the goodput and the throughput, the average packet loss and the
 median/mean power consuption. Before starting the stints the profiler measures
-the idle power consumption.
+the idle power consumption. Results are appended to a journal as they come, so
+that an interrupted campaign can be continued with --resume. See the
+scheduler, active, backends, clock and timing modules for the other options.
 """
 
 import os
 import json
 import signal
+import socket
 import optparse
 import logging
 import sys
-import time
 import threading
-import math
+import functools
 import numpy as np
 
-from energino.energino import PyEnergino
-from energino.energino import DEFAULT_DEVICE
-from energino.energino import DEFAULT_DEVICE_SPEED_BPS
-from energino.energino import DEFAULT_INTERVAL
-
-from click import read_handler, write_handler
+from click import read_handler, batch_handlers, MISSING_HANDLER
+from click import get_control_socket, add_listener, remove_listener
+from ringbuffer import RingBuffer, DEFAULT_CAPACITY
+from stats import StreamingStats
+from airtime import max_tps
+from scheduler import DEFAULT_METER, stint_meter, schedule_rounds
+from scheduler import order_stints
+from active import designs, DEFAULT_TOLERANCE
+from journal import Journal, JOURNAL_SUFFIX, write_atomically
+from backends import BACKENDS, DEFAULT_BACKEND, DEFAULT_RATE, DEFAULT_NOISE
+from backends import DEFAULT_DEVICE, DEFAULT_DEVICE_SPEED_BPS
+from backends import DEFAULT_INTERVAL, create_backend
+from clock import VirtualClock, get_clock, set_clock
+from mockclick import mock_testbed
+from timing import Timings, get_timings, set_timings
 
 DEFAULT_JOULE = './joule.json'
 LOG_FORMAT = '%(asctime)-15s %(message)s'
@@ -65,74 +76,69 @@ def bps_to_human(bps):
     else:
         return "%u bps" % bps
 
-MODES = {('11a', '20', 1) : {'difs' : 34,
-                             'sifs' : 16,
-                             'slot' : 9,
-                             'min_cw' : 15,
-                             'symbol_duration': 4,
-                             'bits_per_symbol' : 216}}
-
-def compute_tx_usec(hwmode, channel, streams, length, mtu=1472):
-    """ Compute max bitrate for a given frame length using the
-    transactional model. """
-
-    if length > mtu:
-        return (compute_tx_usec(hwmode, channel, streams, length / 2, mtu) +
-                compute_tx_usec(hwmode, channel, streams, length / 2, mtu))
-
-    mode = (hwmode, channel, streams)
-
-    difs = MODES[mode]['difs']
-    sifs = MODES[mode]['sifs']
-    slot = MODES[mode]['slot']
-    min_cw = MODES[mode]['min_cw']
-    bits_per_symbol = MODES[mode]['bits_per_symbol']
-    symbol_duration = MODES[mode]['symbol_duration']
-
-    # remove ethernet header push mac header
-    length = length + 8 + 20 + 28 + 8
-
-    # compute number of symbols required (the 6 bits are for OFDM encoding)
-    symbols = math.ceil(float(length * 8 + 6) / bits_per_symbol)
-
-    # 20 usec synch header, each symbol requires 4 usec
-    data = 20 + symbols * symbol_duration
-
-    # 20 usec synch header, plus one ack symbol
-    ack = 20 + symbol_duration
-
-    # worst case backoff
-    backoff = slot * min_cw
-
-    # total time to send the frame
-    dur_trans = difs + data + sifs + ack + backoff
-
-    return dur_trans
-
 DEFAULT_HWMODE = "11a"
 DEFAULT_CHANNEL = "20"
 DEFAULT_STREAMS = 1
 
+DEFAULT_MIN_DURATION = 5
+POLL_INTERVAL = 0.5
+
+DEFAULT_SETTLE_TOLERANCE = 0.05
+DEFAULT_SETTLE_MAX = 5
+SETTLE_WINDOW = 0.5
+DEFAULT_READY_TIMEOUT = 30
+READY_INTERVAL = 0.5
+
 class Modeller(threading.Thread):
-    """ Modeller class. """
+    """ Modeller class. The readings collected since the last reset are kept,
+    with their timestamps, in a preallocated ring buffer, and running
+    statistics of them are updated with every sample. """
 
-    def __init__(self, backend):
+    def __init__(self, backend, capacity=DEFAULT_CAPACITY):
 
         super(Modeller, self).__init__()
         logging.info("starting meter (%s)", backend.__class__.__name__)
         self.stop_event = threading.Event()
         self.daemon = True
-        self.readings = []
+        self.lock = threading.Lock()
+        self.readings = RingBuffer(capacity)
+        self.stats = StreamingStats()
+        self.since = get_clock().time()
         self.backend = backend
 
     def reset_readings(self):
         """ Reset readings. """
-        self.readings = []
 
-    def get_readings(self):
-        """ Return a copy of the readings. """
+        with self.lock:
+            self.readings.clear()
+            self.stats = StreamingStats()
+            self.since = get_clock().time()
+
+    def get_statistics(self):
+        """ Return the median, mean and 95% confidence interval of the
+        readings collected since the last reset. The median is a running
+        estimate, see process_statistics. """
+
+        with self.lock:
+            return self.stats.summary()
+
+    def get_samples(self):
+        """ Return the timestamps and the readings collected since the last
+        reset, at most the capacity of the buffer. """
+
+        with self.lock:
+            return (self.readings.get_times().copy(),
+                    self.readings.get_values().copy())
+
+    def sample_rate(self):
+        """ Return the number of readings per second collected since the
+        last reset. """
 
-        return self.readings[:]
+        with self.lock:
+            elapsed = get_clock().time() - self.since
+            if elapsed <= 0:
+                return 0.0
+            return len(self.stats) / elapsed
 
     def shutdown(self):
         """ Stop modeller. """
@@ -140,12 +146,70 @@ class Modeller(threading.Thread):
         logging.info("stopping modeler")
         self.stop_event.set()
 
+    def start(self):
+        get_clock().attach()
+        super(Modeller, self).start()
+
     def run(self):
-        while not self.stop_event.isSet():
-            try:
-                self.readings.append(self.backend.fetch('power'))
-            except ValueError:
-                self.readings.append(0.0)
+        clock = get_clock()
+        try:
+            while not self.stop_event.isSet():
+                try:
+                    reading = self.backend.fetch('power')
+                except ValueError:
+                    reading = 0.0
+                with self.lock:
+                    self.readings.append(clock.time(), reading)
+                    self.stats.update(reading)
+        finally:
+            clock.detach()
+
+def concurrently(*calls):
+    """ Run the given callables in parallel threads and return their
+    results in order. The first exception raised by a call, if any, is
+    raised again in the caller. While waiting, the caller hands over its
+    share of the clock to the threads: the last thread to finish hands it
+    back, so that a virtual clock never sees the caller as running while it
+    is blocked, nor as sleeping once the threads are done. """
+
+    if len(calls) == 1:
+        return [calls[0]()]
+
+    clock = get_clock()
+    results = [None] * len(calls)
+    errors = []
+    running = [len(calls)]
+    lock = threading.Lock()
+
+    def worker(i, call):
+        """ Run one call and store its outcome. """
+        try:
+            results[i] = call()
+        except Exception as ex:
+            errors.append(ex)
+        finally:
+            with lock:
+                running[0] -= 1
+                last = running[0] == 0
+            if not last:
+                clock.detach()
+
+    threads = [threading.Thread(target=worker, args=(i, calls[i]))
+               for i in range(0, len(calls))]
+
+    for thread in threads[1:]:
+        clock.attach()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
 
 def hlog(handler):
     """ Log a call to an handler. """
@@ -156,6 +220,13 @@ def hlog(handler):
         logging.error("calling %s (%s)", handler[1], handler[0])
     return handler
 
+def hlogs(handlers):
+    """ Log a batch of calls to handlers. """
+
+    for handler in handlers:
+        hlog(handler)
+    return handlers
+
 class Probe(object):
     """ Probe class.
 
@@ -172,40 +243,86 @@ class Probe(object):
         self._packet_rate = 10
         self._packetsize_bytes = 64
         self._limit = 0
-        self.reset()
+        self._written = {}
+        self._session = None
 
-    def reset(self):
-        """ Reset probe. """
+    def ready(self):
+        """ Return True if both click instances answer on their control
+        port. """
 
-        logging.info('resetting click tx daemon (%s:%s)', self.address,
-                                                          self.sender_control)
+        for port in (self.sender_control, self.receiver_control):
+            try:
+                if read_handler(self.address, port, 'version') is None:
+                    return False
+            except socket.error:
+                return False
+
+        return True
+
+    def wait_ready(self, timeout):
+        """ Wait up to timeout seconds for the probe to be ready, e.g.
+        while its click instances are restarted. """
+
+        clock = get_clock()
+        start = clock.time()
+
+        while not self.ready():
+
+            if clock.time() - start >= timeout:
+                logging.warning("probe %s not ready after %us", self.address,
+                                                                timeout)
+                return False
+
+            clock.sleep(READY_INTERVAL)
+
+        return True
+
+    def batch(self, port, statements):
+        """ Execute and log a batch of handlers. Raise socket.error if the
+        remote end is not a click ControlSocket, so that the stint fails. """
+
+        handlers = batch_handlers(self.address, port, statements)
+
+        if handlers is None:
+            raise socket.error("%s:%u is not a click ControlSocket" %
+                               (self.address, port))
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                          'src.active false'))
+        return hlogs(handlers)
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.reset'))
+    def prepare(self, timeout):
+        """ Wait for the probe to be ready and stop the traffic left over by
+        a previous campaign. Return False if the probe is not ready or fails,
+        it is then reset again before each of its stints anyway. """
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'counter_client.reset'))
+        if not self.wait_ready(timeout):
+            return False
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'tr_client.reset'))
+        try:
+            self.reset()
+        except (socket.error, ValueError) as ex:
+            logging.warning("probe %s failed: %s", self.address, ex)
+            return False
 
-        logging.info('resetting click rx daemon (%s:%s)', self.address,
+        return True
+
+    def reset(self):
+        """ Reset probe. """
+
+        logging.info('resetting click tx daemon (%s:%s)', self.address,
                                                           self.sender_control)
 
-        hlog(write_handler(self.address,
-                           self.receiver_control,
-                           'counter_server.reset'))
+        self.batch(self.sender_control,
+                   [('WRITE', 'src.active false'),
+                    ('WRITE', 'src.reset'),
+                    ('WRITE', 'counter_client.reset'),
+                    ('WRITE', 'tr_client.reset')])
+
+        logging.info('resetting click rx daemon (%s:%s)',
+                     self.address, self.receiver_control)
 
-        hlog(write_handler(self.address,
-                           self.receiver_control,
-                           'tr_server.reset'))
+        self.batch(self.receiver_control,
+                   [('WRITE', 'counter_server.reset'),
+                    ('WRITE', 'tr_server.reset')])
 
         self._packet_rate = 10
         self._packetsize_bytes = 64
@@ -216,43 +333,35 @@ class Probe(object):
         logging.info('fetching click daemon status (%s)', self.address)
         status = {}
 
-        client_count = hlog(read_handler(self.address,
-                                         self.sender_control,
-                                        'counter_client.count'))
-
-        status['client_count'] = int(client_count[2])
+        client = self.batch(self.sender_control,
+                            [('READ', 'counter_client.count'),
+                             ('READ', 'tr_client.interval')])
 
-        client_interval = hlog(read_handler(self.address,
-                                            self.sender_control,
-                                            'tr_client.interval'))
+        status['client_count'] = int(client[0][2])
+        status['client_interval'] = float(client[1][2])
 
-        status['client_interval'] = float(client_interval[2])
+        server = self.batch(self.receiver_control,
+                            [('READ', 'counter_server.count'),
+                             ('READ', 'tr_server.interval')])
 
+        status['server_count'] = int(server[0][2])
+        status['server_interval'] = float(server[1][2])
 
-        server_count = hlog(read_handler(self.address,
-                                         self.receiver_control,
-                                        'counter_server.count'))
-
-        status['server_count'] = int(server_count[2])
-
-        server_interval = hlog(read_handler(self.address,
-                                            self.receiver_control,
-                                            'tr_server.interval'))
-
-        status['server_interval'] = float(server_interval[2])
         return status
 
-    def configure_stint(self, stint, tps):
-        """ Configure stint. """
+    def configure_stint(self, stint, tps, duration=None):
+        """ Configure stint. The source is limited to the packets sent in
+        duration seconds, by default the duration of the stint. """
 
         rate = float(stint['bitrate_mbps'] * 1000000)
         size = float(stint['packetsize_bytes'] * 8)
 
-        duration = stint['duration_s']
+        if duration is None:
+            duration = stint['duration_s']
 
         self._packet_rate = int(rate / size)
         self._packetsize_bytes = stint['packetsize_bytes']
-        self._limit = self._packet_rate * duration
+        self._limit = int(self._packet_rate * duration)
 
         bps = bps_to_human(stint['bitrate_mbps'] * 1000000)
 
@@ -262,60 +371,106 @@ class Probe(object):
         logging.info("trasmitting time is %us", duration)
         logging.info("target bitrate is %s", bps)
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.length %u' % self._packetsize_bytes))
+        config = [('src.length', self._packetsize_bytes),
+                  ('src.rate', self._packet_rate),
+                  ('src.limit', self._limit),
+                  ('sha.rate', int(tps))]
+
+        config.extend(self.pattern_config(stint))
+
+        # skip the handlers already holding the right value, unless the
+        # session has been reopened (e.g. click has been restarted)
+        ctrl = get_control_socket(self.address, self.sender_control)
+
+        if ctrl.sessions != self._session:
+            self._written = {}
+            self._session = ctrl.sessions
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.rate %u' % self._packet_rate))
+        config = [x for x in config if self._written.get(x[0]) != x[1]]
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.limit %u' % self._limit))
+        if not config:
+            return
 
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'sha.rate %u' % tps))
+        statements = [('WRITE', '%s %s' % x) for x in config]
+
+        handlers = self.batch(self.sender_control, statements)
+
+        for (name, value), handler in zip(config, handlers):
+            if handler[0] == "200":
+                self._written[name] = value
+            elif (name, value) == ('pat.mode', 'cbr') and \
+                 handler[0] in MISSING_HANDLER:
+                # click probes have no 'pat' element and only run cbr flows
+                self._written[name] = value
+            elif name.startswith('pat.'):
+                raise ValueError("probe %s does not support pattern %s" %
+                                 (self.address, handler[1]))
+
+    def pattern_config(self, stint):
+        """ Return the handlers writing the 'pattern' of a stint, e.g.
+        {"mode": "onoff", "on": 0.1, "off": 0.4}, to the 'pat' element, see
+        the engine module. The mode is always included, so that a probe whose
+        mode is unknown, e.g. after a reconnection, is set back to CBR. """
+
+        pattern = stint.get('pattern', {'mode' : 'cbr'})
+
+        config = []
+
+        for name in ('trace', 'on', 'off', 'seed'):
+            if name in pattern:
+                config.append(('pat.%s' % name, pattern[name]))
+
+        config.append(('pat.mode', pattern['mode']))
+
+        return config
+
+    def received(self):
+        """ Fetch the number of packets received by the probe, None if the
+        probe is unreachable. """
+
+        try:
+            count = self.batch(self.receiver_control,
+                               [('READ', 'counter_server.count')])[0]
+            return int(count[2])
+        except (socket.error, ValueError):
+            return None
 
     def start_stint(self):
         """ Start stint. """
 
         logging.info("starting probe (%s)", self.address)
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.active true'))
+        self.batch(self.sender_control, [('WRITE', 'src.active true')])
 
     def stop_stint(self):
         """ Stop stint. """
 
         logging.info("stopping probe (%s)", self.address)
-        hlog(write_handler(self.address,
-                           self.sender_control,
-                           'src.active false'))
+        self.batch(self.sender_control, [('WRITE', 'src.active false')])
 
-def process_readings(readings):
-    """ Process readings. """
+def process_statistics(modeller):
+    """ Process the statistics of the modeller at the end of a stint. The
+    running median is only an estimate, so the median is computed from the
+    buffered readings, the most recent ones if the buffer wrapped around. """
 
-    median = np.median(readings)
-    mean = np.mean(readings)
+    stats = modeller.get_statistics()
+    _, readings = modeller.get_samples()
 
-    ci = 1.96 * (np.std(readings) / np.sqrt(len(readings)))
+    if len(readings) > 0:
+        stats['median'] = float(np.median(readings))
 
     logging.info("median power consumption: %f, mean power "\
-        "consumption: %f, confidence: %f", median, mean, ci)
+        "consumption: %f, confidence: %f", stats['median'], stats['mean'],
+        stats['ci'])
 
-    return {'ci' : ci, 'median' : median, 'mean' : mean}
+    return stats
 
 def run_stint(stint, src, dst, modeller, options):
     """ Run a stint. """
 
-    tx_usecs_udp = compute_tx_usec(options.hwmode,
-                                   options.channel,
-                                   options.streams,
-                                   stint['packetsize_bytes'])
-
-    tps = 1000000 / tx_usecs_udp
+    tps = float(max_tps(options.hwmode,
+                        options.channel,
+                        options.streams,
+                        stint['packetsize_bytes']))
 
     logging.info("maximum tps for this medium (%s,%s,%u) is %d TPS",
                  options.hwmode, options.channel, options.streams, tps)
@@ -323,27 +478,95 @@ def run_stint(stint, src, dst, modeller, options):
     logging.info("maximum theoretical goodput is %s",
                  bps_to_human(stint['packetsize_bytes']*8*tps))
 
+    timings = get_timings()
+
     # reset probes
-    src.reset()
-    dst.reset()
+    with timings.phase('reset'):
+        concurrently(src.reset, dst.reset)
 
-    # run stint
-    src.configure_stint(stint, tps)
+    # run stint, in adaptive mode the source must last the longest stint
+    with timings.phase('configure_stint'):
+        src.configure_stint(stint, tps, max_duration(stint, options))
 
     modeller.reset_readings()
 
-    src.start_stint()
-    time.sleep(stint['duration_s'])
-    src.stop_stint()
+    with timings.phase('start_stint'):
+        src.start_stint()
+
+    if hasattr(modeller.backend, 'start_stint'):
+        modeller.backend.start_stint(stint)
+
+    with timings.phase('wait_stint'):
+        elapsed = wait_stint(stint, modeller, options)
+
+    with timings.phase('stop_stint'):
+        src.stop_stint()
+
+    if hasattr(modeller.backend, 'stop_stint'):
+        modeller.backend.stop_stint()
+
+    stint['stats'] = {'duration_s' : elapsed}
+
+def max_duration(stint, options):
+    """ Return the longest a stint can last. """
+
+    if options.ci is None:
+        return stint['duration_s']
+
+    return options.max_duration or stint['duration_s']
+
+def wait_stint(stint, modeller, options):
+    """ Wait for the end of a stint and return its actual duration. If a
+    target confidence interval is set the stint is stopped as soon as the
+    95% confidence interval of the readings falls below the target, but not
+    before min_duration seconds and not after max_duration seconds. """
+
+    clock = get_clock()
+
+    if options.ci is None:
+        clock.sleep(stint['duration_s'])
+        return stint['duration_s']
+
+    longest = max_duration(stint, options)
+    shortest = min(options.min_duration, longest)
+
+    start = clock.time()
+    clock.sleep(shortest)
+
+    while True:
+
+        elapsed = clock.time() - start
+        stats = modeller.get_statistics()
+
+        if stats['ci'] <= options.ci:
+            logging.info("confidence %f reached after %fs", stats['ci'],
+                                                            elapsed)
+            break
+
+        if elapsed >= longest:
+            logging.info("confidence %f not reached after %fs", stats['ci'],
+                                                                elapsed)
+            break
+
+        clock.sleep(min(POLL_INTERVAL, longest - elapsed))
+
+    return elapsed
 
 def process_stint(stint, src, dst, modeller, options):
     """ Process stint. """
 
     # compute statistics
-    stint['stats'] = process_readings(modeller.get_readings())
+    if not 'stats' in stint:
+        stint['stats'] = {}
 
-    src_status = src.status()
-    dst_status = dst.status()
+    timings = get_timings()
+    timings.record('sample_rate', modeller.sample_rate())
+
+    with timings.phase('process_statistics'):
+        stint['stats'].update(process_statistics(modeller))
+
+    with timings.phase('status'):
+        src_status, dst_status = concurrently(src.status, dst.status)
 
     client_count = src_status['client_count']
     server_count = dst_status['server_count']
@@ -371,9 +594,6 @@ def process_stint(stint, src, dst, modeller, options):
     if client_count != 0:
         losses = float(client_count - server_count) / client_count
 
-    if not 'stats' in stint:
-        stint['stats'] = {}
-
     stint['stats']['tp'] = tp_bps
     stint['stats']['gp'] = gp_bps
     stint['stats']['losses'] = losses
@@ -388,13 +608,287 @@ def run_idle_stint(stint, modeller, options):
     """ Run the idle stint. """
 
     logging.info("evaluating idle power consumption")
-    logging.info("idle time is %us", stint['duration_s'])
+    logging.info("idle time is %us", max_duration(stint, options))
     modeller.reset_readings()
-    time.sleep(stint['duration_s'])
-    readings = modeller.get_readings()
+    elapsed = wait_stint(stint, modeller, options)
 
     # compute statistics
-    stint['stats'] = process_readings(readings)
+    stint['stats'] = process_statistics(modeller)
+    stint['stats']['duration_s'] = elapsed
+
+def run_idle_stints(data, modellers, journal, options, done=()):
+    """ Run the idle stint on all the meters at the same time, skipping the
+    meters in done. The idle power of the meters defined in the descriptor
+    is saved in their own entry. """
+
+    calls = []
+    idles = []
+
+    for name in modellers:
+
+        if name in done:
+            continue
+
+        if name == DEFAULT_METER:
+            idle = data['idle']
+        else:
+            idle = dict(data['idle'])
+            data['meters'][name]['idle'] = idle
+
+        idles.append((name, idle))
+        calls.append(functools.partial(run_idle_stint, idle, modellers[name],
+                                       options))
+
+    if calls:
+        concurrently(*calls)
+
+    for name, idle in idles:
+        journal.append({'idle' : name, 'stats' : idle['stats']})
+
+def stint_key(stint):
+    """ Return the parameters identifying a stint in the journal. """
+
+    key = [stint['src'],
+           stint['dst'],
+           stint['bitrate_mbps'],
+           stint['packetsize_bytes']]
+
+    if 'pattern' in stint:
+        key.append(stint['pattern'])
+
+    return key
+
+def restore_journal(data, entries):
+    """ Restore in the descriptor the results saved in the journal. Entries
+    not matching the descriptor are ignored. Return the meters whose idle
+    power is known and the indexes of the completed stints. """
+
+    idles = set()
+    completed = set()
+
+    for entry in entries:
+
+        if 'idle' in entry:
+
+            name = entry['idle']
+
+            if name == DEFAULT_METER:
+                data['idle']['stats'] = entry['stats']
+            elif name in data.get('meters', {}):
+                idle = dict(data['idle'])
+                idle['stats'] = entry['stats']
+                data['meters'][name]['idle'] = idle
+            else:
+                continue
+
+            idles.add(name)
+
+        elif 'stint' in entry:
+
+            i = entry['stint']
+
+            if i >= len(data['stints']):
+                continue
+
+            if stint_key(data['stints'][i]) != entry['key']:
+                continue
+
+            data['stints'][i]['stats'] = entry['stats']
+            completed.add(i)
+
+    return idles, completed
+
+def run_profile(i, data, probes, modellers, journal, options):
+    """ Run and process the i-th stint. A stint whose probes are not ready,
+    or fail while it runs, is left without results, so that --resume runs it
+    again. """
+
+    stint = data['stints'][i]
+
+    src = probes[stint['src']]
+    dst = probes[stint['dst']]
+
+    modeller = modellers[stint_meter(data, stint)]
+
+    logging.info('-----------------------------------------------------')
+    logging.info("running profile %u/%u, %s -> %s:%u", i+1,
+                                                       len(data['stints']),
+                                                       src.address,
+                                                       dst.address,
+                                                       dst.receiver_port)
+
+    # a stint failing on a dead probe is left without results and run
+    # again on resume
+    ready = concurrently(functools.partial(src.wait_ready,
+                                           options.ready_timeout),
+                         functools.partial(dst.wait_ready,
+                                           options.ready_timeout))
+
+    if not all(ready):
+        logging.warning("skipping profile %u/%u, probe not ready",
+                        i+1, len(data['stints']))
+        return
+
+    try:
+
+        # run stint
+        run_stint(stint, src, dst, modeller, options)
+
+        # process stint
+        process_stint(stint, src, dst, modeller, options)
+
+    except (socket.error, ValueError) as ex:
+        logging.warning("profile %u/%u failed (%s)",
+                        i+1, len(data['stints']), ex)
+        stint.pop('stats', None)
+        return
+
+    with get_timings().phase('journal'):
+        journal.append({'stint' : i,
+                        'key' : stint_key(stint),
+                        'stats' : stint['stats']})
+
+def run_rounds(data, indexes, probes, modellers, journal, options):
+    """ Run the given stints, stints sharing no probe and no meter run at
+    the same time. """
+
+    for round_indexes in schedule_rounds(data, indexes):
+
+        calls = [functools.partial(run_profile, i, data, probes, modellers,
+                                   journal, options) for i in round_indexes]
+
+        concurrently(*calls)
+
+        # wait for the network to settle down
+        meters = {}
+        for i in round_indexes:
+            stint = data['stints'][i]
+            meters[stint_meter(data, stint)] = [probes[stint['dst']]]
+
+        with get_timings().phase('settle'):
+            settle(meters, data, modellers, options)
+
+def run_adaptive(data, indexes, probes, modellers, journal, options):
+    """ Run the given stints in adaptive mode: every direction picks its
+    next stint from the results so far until its model converges, see the
+    active module. """
+
+    idle = functools.partial(idle_stats, data)
+
+    active = designs(data, indexes, idle, options.tolerance)
+
+    while True:
+
+        picked = [design.next() for design in active]
+        picked = [i for i in picked if i is not None]
+
+        if not picked:
+            break
+
+        run_rounds(data, picked, probes, modellers, journal, options)
+
+    logging.info("adaptive campaign done, %u/%u stints run",
+                 len([x for x in data['stints'] if 'stats' in x]),
+                 len(data['stints']))
+
+def start_modellers(data, options):
+    """ Start a modeller for the default meter, configured from the command
+    line, and one for every meter defined in the descriptor. Settings not
+    given in the descriptor default to the command line ones. """
+
+    meters = {DEFAULT_METER : {}}
+    meters.update(data.get('meters', {}))
+
+    modellers = {}
+
+    for name, meter in meters.items():
+
+        settings = {'device' : options.device,
+                    'bps' : options.bps,
+                    'interval' : options.interval,
+                    'trace' : options.trace,
+                    'models' : options.models,
+                    'rate' : options.rate,
+                    'noise' : options.noise,
+                    'directions' : data.get('models', {})}
+
+        settings.update(meter)
+
+        backend = create_backend(settings.get('backend', options.backend),
+                                 settings)
+
+        # a virtual clock only advances while the sampling thread sleeps
+        if isinstance(get_clock(), VirtualClock) and \
+           getattr(backend, 'rate', 0) <= 0:
+            raise ValueError("meter %s cannot run on a virtual clock" % name)
+
+        modellers[name] = Modeller(backend)
+        modellers[name].start()
+
+    return modellers
+
+def write_descriptor(data, options):
+    """ Save the Joule descriptor. """
+
+    write_atomically(os.path.expanduser(options.joule), data)
+
+def idle_stats(data, meter):
+    """ Return the statistics of the idle stint of a meter. """
+
+    if meter == DEFAULT_METER:
+        return data['idle']['stats']
+
+    return data['meters'][meter]['idle']['stats']
+
+def idle_power(data, meter):
+    """ Return the idle power measured by a meter. """
+
+    return idle_stats(data, meter)['median']
+
+def wait_settle(modeller, baseline, probes, options):
+    """ Wait for the network and the device to settle down after a stint:
+    the power readings must be back within settle_tolerance (a fraction) of
+    the idle baseline and the probes must have stopped receiving packets.
+    Give up after settle_max seconds. Return the time spent waiting. """
+
+    clock = get_clock()
+    start = clock.time()
+    counts = None
+
+    while True:
+
+        elapsed = clock.time() - start
+
+        if elapsed >= options.settle_max:
+            logging.info("not settled after %fs", elapsed)
+            return elapsed
+
+        modeller.reset_readings()
+        clock.sleep(min(SETTLE_WINDOW, options.settle_max - elapsed))
+
+        power = modeller.get_statistics()['mean']
+        current = [probe.received() for probe in probes]
+
+        if counts == current and \
+           abs(power - baseline) <= options.settle_tolerance * baseline:
+            elapsed = clock.time() - start
+            logging.info("settled after %fs (%f W)", elapsed, power)
+            return elapsed
+
+        counts = current
+
+def settle(meters, data, modellers, options):
+    """ Wait for the given meters, mapped to the probes whose counters must
+    stop, to settle down at the same time. """
+
+    calls = [functools.partial(wait_settle,
+                               modellers[meter],
+                               idle_power(data, meter),
+                               meters[meter],
+                               options) for meter in meters]
+
+    if calls:
+        concurrently(*calls)
 
 def sigint_handler(*_):
     """ Handle SIGINT. """
@@ -419,6 +913,30 @@ def main():
                       dest="interval",
                       default=DEFAULT_INTERVAL)
 
+    parser.add_option('--backend',
+                      type="choice",
+                      choices=sorted(BACKENDS.keys()),
+                      dest="backend",
+                      default=DEFAULT_BACKEND)
+
+    parser.add_option('--trace',
+                      dest="trace",
+                      default=None)
+
+    parser.add_option('--models',
+                      dest="models",
+                      default=None)
+
+    parser.add_option('--rate',
+                      type="float",
+                      dest="rate",
+                      default=DEFAULT_RATE)
+
+    parser.add_option('--noise',
+                      type="float",
+                      dest="noise",
+                      default=DEFAULT_NOISE)
+
     parser.add_option('--joule', '-j',
                       dest="joule",
                       default=DEFAULT_JOULE)
@@ -432,9 +950,80 @@ def main():
                       default=DEFAULT_CHANNEL)
 
     parser.add_option('--streams', '-s',
+                      type="int",
                       dest="streams",
                       default=DEFAULT_STREAMS)
 
+    parser.add_option('--ci',
+                      type="float",
+                      dest="ci",
+                      default=None)
+
+    parser.add_option('--min_duration',
+                      type="float",
+                      dest="min_duration",
+                      default=DEFAULT_MIN_DURATION)
+
+    parser.add_option('--max_duration',
+                      type="float",
+                      dest="max_duration",
+                      default=None)
+
+    parser.add_option('--settle_tolerance',
+                      type="float",
+                      dest="settle_tolerance",
+                      default=DEFAULT_SETTLE_TOLERANCE)
+
+    parser.add_option('--settle_max',
+                      type="float",
+                      dest="settle_max",
+                      default=DEFAULT_SETTLE_MAX)
+
+    parser.add_option('--order', '-o',
+                      type="choice",
+                      choices=['descriptor', 'optimized'],
+                      dest="order",
+                      default='descriptor')
+
+    parser.add_option('--adaptive', '-a',
+                      action="store_true",
+                      dest="adaptive",
+                      default=False)
+
+    parser.add_option('--tolerance',
+                      type="float",
+                      dest="tolerance",
+                      default=DEFAULT_TOLERANCE)
+
+    parser.add_option('--ready_timeout',
+                      type="float",
+                      dest="ready_timeout",
+                      default=DEFAULT_READY_TIMEOUT)
+
+    parser.add_option('--journal',
+                      dest="journal",
+                      default=None)
+
+    parser.add_option('--resume', '-r',
+                      action="store_true",
+                      dest="resume",
+                      default=False)
+
+    parser.add_option('--clock',
+                      type="choice",
+                      choices=['wall', 'virtual'],
+                      dest="clock",
+                      default='wall')
+
+    parser.add_option('--mock',
+                      action="store_true",
+                      dest="mock",
+                      default=False)
+
+    parser.add_option('--timings',
+                      dest="timings",
+                      default=None)
+
     parser.add_option('--verbose', '-v',
                       action="store_true",
                       dest="verbose",
@@ -463,65 +1052,79 @@ def main():
 
     logging.info("starting Joule Profiler")
 
-    # initialize modeller
-    meter = PyEnergino(options.device, options.bps, options.interval)
-    modeller = Modeller(meter)
+    if options.clock == 'virtual':
+        set_clock(VirtualClock())
 
-    # starting modeller
-    modeller.start()
+    # the main thread takes part in the simulation
+    get_clock().attach()
 
-    # initialize probe objects
-    probes = {x : Probe(data['probes'][x]) for x in data['probes']}
+    # time the control loop and the handlers
+    timings = Timings(options.timings)
+    set_timings(timings)
+    add_listener(timings.handler_listener)
 
-    # evaluate idle power consumption
-    run_idle_stint(data['idle'], modeller, options)
+    # emulate the probes
+    if options.mock:
+        for mock in mock_testbed(data).values():
+            mock.start()
 
-    with open(os.path.expanduser(options.joule), 'w') as data_file:
+    # initialize and start modellers
+    modellers = start_modellers(data, options)
 
-        json.dump(data,
-                  data_file,
-                  sort_keys=True,
-                  indent=4,
-                  separators=(',', ': '))
+    # initialize probe objects, probes down at launch only fail their stints
+    probes = dict((x, Probe(data['probes'][x])) for x in data['probes'])
+    concurrently(*[functools.partial(probe.prepare, options.ready_timeout)
+                   for probe in probes.values()])
 
-    # idle
-    time.sleep(5)
+    # restore the results of an interrupted campaign
+    journal = Journal(options.journal or
+                      os.path.expanduser(options.joule) + JOURNAL_SUFFIX)
 
-    # start with the stints
-    logging.info("running stints")
+    idles = set()
+    completed = set()
 
-    for i in range(0, len(data['stints'])):
+    if options.resume:
+        idles, completed = restore_journal(data, journal.load())
+        logging.info("resuming, %u/%u stints already completed",
+                     len(completed), len(data['stints']))
 
-        stint = data['stints'][i]
+    journal.open(options.resume)
 
-        src = probes[stint['src']]
-        dst = probes[stint['dst']]
+    # evaluate idle power consumption
+    with timings.phase('idle'):
+        run_idle_stints(data, modellers, journal, options, idles)
 
-        logging.info('-----------------------------------------------------')
-        logging.info("running profile %u/%u, %s -> %s:%u", i+1,
-                                                           len(data['stints']),
-                                                           src.address,
-                                                           dst.address,
-                                                           dst.receiver_port)
+    # idle
+    with timings.phase('settle'):
+        settle(dict((meter, []) for meter in modellers if meter not in idles),
+               data, modellers, options)
 
-        # run stint
-        run_stint(stint, src, dst, modeller, options)
+    # start with the stints, stints sharing no probe and no meter run at the
+    # same time
+    logging.info("running stints")
 
-        # process stint
-        process_stint(stint, src, dst, modeller, options)
+    pending = [i for i in range(0, len(data['stints'])) if i not in completed]
+
+    if options.order == 'optimized':
+        pending = order_stints(data, pending)
+
+    if options.adaptive:
+        run_adaptive(data, pending, probes, modellers, journal, options)
+    else:
+        run_rounds(data, pending, probes, modellers, journal, options)
+
+    # stopping modellers
+    for modeller in modellers.values():
+        modeller.shutdown()
 
-        with open(os.path.expanduser(options.joule), 'w') as data_file:
-            json.dump(data,
-                      data_file,
-                      sort_keys=True,
-                      indent=4,
-                      separators=(',', ': '))
+    remove_listener(timings.handler_listener)
+    data['timings'] = timings.histograms()
 
-        # sleep in order to let the network settle down
-        time.sleep(5)
+    with timings.phase('write_descriptor'):
+        write_descriptor(data, options)
 
-    # stopping modeller
-    modeller.shutdown()
+    journal.close()
+    timings.close()
 
 if __name__ == "__main__":
     main()
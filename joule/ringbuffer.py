@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A preallocated ring buffer of timestamped samples. The buffer keeps the most
+recent samples, overwriting the oldest ones when it is full, so that memory
+usage does not depend on how long samples are collected. At the default
+capacity samples and timestamps take 1 MB.
+"""
+
+import numpy as np
+
+DEFAULT_CAPACITY = 1 << 16
+
+class RingBuffer(object):
+    """ Ring buffer of float64 samples and their timestamps. """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, value):
+        """ Append a sample, overwriting the oldest one if full. """
+
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+
+        self.head = (self.head + 1) % self.capacity
+
+        if self.size < self.capacity:
+            self.size += 1
+
+    def clear(self):
+        """ Drop all the samples. """
+
+        self.head = 0
+        self.size = 0
+
+    def _ordered(self, array):
+        """ Return the valid part of array in chronological order. This is a
+        view unless the buffer has wrapped around. """
+
+        if self.size < self.capacity:
+            return array[:self.size]
+
+        return np.concatenate((array[self.head:], array[:self.head]))
+
+    def get_times(self):
+        """ Return the timestamps in chronological order. """
+
+        return self._ordered(self.times)
+
+    def get_values(self):
+        """ Return the samples in chronological order. """
+
+        return self._ordered(self.values)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The Joule Scheduler. Two stints conflict when they share a probe or a power
+meter: probes carry a single flow at a time and a meter can only attribute
+its readings to one stint. Stints that do not conflict can run at the same
+time. A probe is bound to a meter with the optional 'meter' key of its entry
+in the Joule descriptor, a stint can override it with its own 'meter' key.
+Probes and stints without a meter use the default one. Stints can also be
+reordered to reduce the reconfiguration of the probes and the power swings
+between consecutive stints.
+"""
+
+DEFAULT_METER = 'default'
+
+def probe_meter(data, probe_id):
+    """ Return the meter measuring a probe. """
+
+    return data['probes'][probe_id].get('meter', DEFAULT_METER)
+
+def stint_meter(data, stint):
+    """ Return the meter whose readings are assigned to a stint. """
+
+    if 'meter' in stint:
+        return stint['meter']
+
+    return probe_meter(data, stint['src'])
+
+def stint_resources(data, stint):
+    """ Return the set of resources used by a stint: its probes, the meter
+    its readings come from and the meters measuring its probes. """
+
+    return set([('probe', stint['src']),
+                ('probe', stint['dst']),
+                ('meter', stint_meter(data, stint)),
+                ('meter', probe_meter(data, stint['src'])),
+                ('meter', probe_meter(data, stint['dst']))])
+
+def conflict_graph(data, indexes):
+    """ Return the conflict graph of the given stints as a dictionary
+    mapping each stint index to the set of indexes it conflicts with. """
+
+    users = {}
+
+    for i in indexes:
+        for resource in stint_resources(data, data['stints'][i]):
+            users.setdefault(resource, []).append(i)
+
+    graph = dict((i, set()) for i in indexes)
+
+    for sharing in users.values():
+        for i in sharing:
+            graph[i].update(j for j in sharing if j != i)
+
+    return graph
+
+def schedule_rounds(data, indexes):
+    """ Split the given stints in rounds of stints that can run at the same
+    time. Each stint is placed in the round following the last round holding
+    an earlier stint it conflicts with, so conflicting stints keep their
+    relative order. With a single meter every round holds one stint. """
+
+    graph = conflict_graph(data, indexes)
+
+    rounds = []
+    placed = {}
+
+    for i in indexes:
+
+        previous = [placed[j] for j in graph[i] if j in placed]
+        level = max(previous) + 1 if previous else 0
+
+        if level == len(rounds):
+            rounds.append([])
+
+        rounds[level].append(i)
+        placed[i] = level
+
+    return rounds
+
+def order_stints(data, indexes):
+    """ Reorder the given stints so that consecutive stints differ as little
+    as possible: stints are grouped by direction and by packet size, sizes
+    are visited in increasing order and within a size the rate is ramped up
+    and down on alternate sizes. A rate step then only rewrites src.rate and
+    src.limit, a size step also src.length and sha.rate, and the power drawn
+    moves smoothly from one stint to the next instead of jumping from the
+    highest to the lowest rate. """
+
+    directions = []
+    groups = {}
+
+    for i in indexes:
+
+        stint = data['stints'][i]
+        direction = (stint['src'], stint['dst'])
+
+        if direction not in groups:
+            directions.append(direction)
+            groups[direction] = {}
+
+        sizes = groups[direction]
+        sizes.setdefault(stint['packetsize_bytes'], []).append(i)
+
+    ordered = []
+
+    for direction in directions:
+
+        sizes = groups[direction]
+
+        for step, size in enumerate(sorted(sizes)):
+
+            ramp = sorted(sizes[size],
+                          key=lambda i: data['stints'][i]['bitrate_mbps'],
+                          reverse=(step % 2 == 1))
+
+            ordered.extend(ramp)
+
+    return ordered
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Online statistics for power readings. Samples are accumulated one at a time
+in constant memory: mean and variance with Welford's algorithm and quantiles
+with the P-square estimator by Jain and Chlamtac, so that the statistics of
+a stint are available while the stint is running.
+"""
+
+import math
+
+class Welford(object):
+    """ Running mean and variance. """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        """ Add a sample. """
+
+        self.count += 1
+        delta = float(value) - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        """ Return the population variance. """
+
+        if self.count == 0:
+            return float('nan')
+        return self.m2 / self.count
+
+    def std(self):
+        """ Return the population standard deviation. """
+
+        return math.sqrt(self.variance())
+
+class P2Quantile(object):
+    """ P-square estimator of the p-quantile. Five markers are kept, the
+    estimate is exact until five samples have been seen. """
+
+    def __init__(self, p=0.5):
+
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _parabolic(self, i, d):
+        """ Piecewise-parabolic prediction of marker i moved by d. """
+
+        q = self.heights
+        n = self.positions
+
+        return q[i] + float(d) / (n[i + 1] - n[i - 1]) * \
+            ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+             (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d):
+        """ Linear prediction of marker i moved by d. """
+
+        q = self.heights
+        n = self.positions
+
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def update(self, value):
+        """ Add a sample. """
+
+        value = float(value)
+
+        self.count += 1
+        q = self.heights
+        n = self.positions
+
+        if self.count <= 5:
+            q.append(value)
+            if self.count == 5:
+                q.sort()
+            return
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+
+        for i in range(0, 5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+
+            d = self.desired[i] - n[i]
+
+            if (d >= 1 and n[i + 1] - n[i] > 1) or \
+               (d <= -1 and n[i - 1] - n[i] < -1):
+
+                d = 1 if d > 0 else -1
+
+                height = self._parabolic(i, d)
+
+                if not q[i - 1] < height < q[i + 1]:
+                    height = self._linear(i, d)
+
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        """ Return the current estimate. """
+
+        if self.count == 0:
+            return float('nan')
+
+        if self.count < 5:
+            q = sorted(self.heights)
+            rank = self.p * (len(q) - 1)
+            low = int(math.floor(rank))
+            high = min(low + 1, len(q) - 1)
+            return q[low] + (rank - low) * (q[high] - q[low])
+
+        return self.heights[2]
+
+class StreamingStats(object):
+    """ Mean, standard deviation, median and 95% confidence interval of a
+    stream of readings. """
+
+    def __init__(self):
+        self.moments = Welford()
+        self.median = P2Quantile(0.5)
+
+    def __len__(self):
+        return self.moments.count
+
+    def update(self, value):
+        """ Add a reading. """
+
+        self.moments.update(value)
+        self.median.update(value)
+
+    def ci(self):
+        """ Return the half-width of the 95% confidence interval. """
+
+        if self.moments.count == 0:
+            return float('nan')
+
+        return 1.96 * (self.moments.std() / math.sqrt(self.moments.count))
+
+    def summary(self):
+        """ Return the median, mean and confidence interval as a dict. """
+
+        return {'ci' : self.ci(),
+                'median' : self.median.value(),
+                'mean' : self.moments.mean}
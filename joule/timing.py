@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Instrumentation of the profiler control loop. Named phases (probe resets,
+stint configuration, waits, status polls, descriptor writes, ...) are timed
+against the wall clock, together with the round-trip time of every batch of
+ControlSocket handlers and the sample rate achieved by the meters. Values are
+kept per name and summarized as histograms with logarithmic buckets; each
+value can also be appended, as it is recorded, to a JSON lines trace.
+"""
+
+import json
+import time
+import math
+import threading
+import contextlib
+import numpy as np
+
+# histogram buckets per decade
+BUCKETS_PER_DECADE = 4
+
+def histogram(values):
+    """ Summarize a list of values. Buckets are logarithmic and span the
+    decades covered by the values, the first one starts at zero. """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    positive = values[values > 0]
+
+    if len(positive):
+        low = int(math.floor(math.log10(positive.min())))
+        high = int(math.ceil(math.log10(positive.max())))
+    else:
+        low, high = 0, 0
+
+    if high == low:
+        high += 1
+
+    edges = np.logspace(low, high, (high - low) * BUCKETS_PER_DECADE + 1)
+    edges[0] = 0.0
+
+    counts, _ = np.histogram(values, edges)
+
+    return {'count' : len(values),
+            'total' : float(values.sum()),
+            'mean' : float(values.mean()),
+            'min' : float(values.min()),
+            'max' : float(values.max()),
+            'p50' : float(np.percentile(values, 50)),
+            'p90' : float(np.percentile(values, 90)),
+            'p99' : float(np.percentile(values, 99)),
+            'edges' : edges.tolist(),
+            'counts' : counts.tolist()}
+
+class Timings(object):
+    """ Collects named values, optionally tracing them to a file. """
+
+    def __init__(self, trace=None):
+
+        self.lock = threading.Lock()
+        self.values = {}
+        self.trace = None
+
+        if trace is not None:
+            self.trace = open(trace, 'w')
+
+    def record(self, name, value, **fields):
+        """ Record a value, the fields are only written to the trace. """
+
+        with self.lock:
+
+            self.values.setdefault(name, []).append(value)
+
+            if self.trace is not None:
+                entry = {'name' : name, 'at' : time.time(), 'value' : value}
+                entry.update(fields)
+                self.trace.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    @contextlib.contextmanager
+    def phase(self, name, **fields):
+        """ Record the time spent in the body of a with statement. """
+
+        start = time.time()
+
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start, **fields)
+
+    def handler_listener(self, address, port, statements, elapsed):
+        """ Record the round-trip time of a batch of handlers, see
+        click.add_listener. """
+
+        self.record('handlers', elapsed, address=address, port=port,
+                    statements=len(statements))
+
+    def histograms(self):
+        """ Return the histograms of all the recorded values. """
+
+        with self.lock:
+            return dict((name, histogram(values))
+                        for name, values in self.values.items())
+
+    def close(self):
+        """ Close the trace. """
+
+        with self.lock:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
+
+_TIMINGS = Timings()
+
+def get_timings():
+    """ Return the timings in use. """
+    return _TIMINGS
+
+def set_timings(timings):
+    """ Set the timings in use. """
+    global _TIMINGS
+    _TIMINGS = timings
@@ -26,7 +26,10 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 """
-The Joule Virtual Power Meter
+The Joule Virtual Power Meter. The RX and TX packet length histograms are
+dumped by the click ControlSocket on port 5555 with the write_text_file
+handler, which replies once the file has been written, and read back from
+/tmp.
 """
 
 import sys
@@ -37,13 +40,23 @@ import time
 import json
 import os
 import datetime
-import scipy.io
+
+try:
+    import scipy.io
+except ImportError:
+    scipy = None
 
 from click import write_handler
 
 DEFAULT_MODELS = './models.json'
 DEFAULT_INTERVAL = 2000
 
+MONITOR_ADDRESS = '127.0.0.1'
+MONITOR_PORT = 5555
+
+# account for ethernet (14), ip (20), and udp (8) headers
+HEADERS_LENGTH = 14 + 20 + 8
+
 LOG_FORMAT = '%(asctime)-15s %(message)s'
 
 def compute_power(models, model, x_min, x_mbps, d_bytes):
@@ -61,6 +74,15 @@ def compute_power(models, model, x_min, x_mbps, d_bytes):
     alpha_d = alpha0 * (1 + (alpha1 / d_bytes))
     return alpha_d * x_mbps + gamma
 
+def parse_aggregates(text):
+    """ Parse a histogram in the IPAggregate text format into an array of
+    (length, count) rows. """
+
+    values = " ".join([line for line in text.splitlines()
+                       if not line.startswith('!')])
+
+    return np.array(values.split(), dtype=int).reshape(-1, 2)
+
 class VirtualMeter(object):
     """ Virtual Power meter. """
 
@@ -143,32 +165,40 @@ class VirtualMeter(object):
 
         return power
 
-    def generate_bins(self, model):
-        """ Poll click process. """
+    def dump_samples(self, model):
+        """ Dump the histogram to a text file and read it back. The write
+        handler returns once the file has been written. """
 
-        results = write_handler('127.0.0.1', 5555,
+        results = write_handler(MONITOR_ADDRESS, MONITOR_PORT,
                                 "%s.write_text_file /tmp/%s" % (model, model))
-        if results[0] != '200':
-            return np.array([])
-        time.sleep(0.1)
+        if results is None or results[0] != '200':
+            return None
         try:
-            samples = np.genfromtxt('/tmp/%s' % model, dtype=int, comments="!")
+            with open('/tmp/%s' % model) as text_file:
+                return parse_aggregates(text_file.read())
         except IOError:
-            samples = np.array([[]])
-        bins = np.zeros(shape=(len(self.packet_sizes[model]),1))
-        if np.ndim(samples) != 2:
-            return bins
-        for sample in samples:
-            if len(sample) == 0:
-                continue
-            # account for ethernet (14), ip (20), and udp (8) headers
-            size = sample[0] - 14 - 20 - 8
-            count = sample[1]
-            for i in range(0, len(self.packet_sizes[model])):
-                if size <= self.packet_sizes[model][i]:
-                    bins[i] = bins[i] + count
-                    break
-        return bins
+            return np.zeros(shape=(0, 2), dtype=int)
+
+    def generate_bins(self, model):
+        """ Poll click process. """
+
+        samples = self.dump_samples(model)
+        if samples is None:
+            return np.array([])
+        return self.bin_samples(model, samples)
+
+    def bin_samples(self, model, samples):
+        """ Count the packets falling in each packet size bin, a packet
+        going to the smallest bin not shorter than its payload. Packets
+        larger than the largest bin are not counted. """
+
+        edges = self.packet_sizes[model]
+        sizes = samples[:, 0] - HEADERS_LENGTH
+        idx = np.searchsorted(edges, sizes, side='left')
+        valid = idx < len(edges)
+        counts = samples[valid, 1].astype(float)
+        bins = np.bincount(idx[valid], weights=counts, minlength=len(edges))
+        return bins.reshape(len(edges), 1)
 
 def main():
     """ Main method. """
@@ -197,6 +227,9 @@ def main():
 
     options, _ = parser.parse_args()
 
+    if options.matlab != None and scipy is None:
+        parser.error("--matlab requires scipy")
+
     with open(os.path.expanduser(options.models)) as data_file:
         models = json.load(data_file)
 
@@ -46,7 +46,9 @@ setup(name="joule",
                      "joule-profiler=joule.profiler:main",
                      "joule-modeller=joule.modeller:main",
                      "joule-dumpcsv=joule.dumpcsv:main",
-                     "joule-template=joule.template:main"]},
+                     "joule-template=joule.template:main",
+                     "joule-mockclick=joule.mockclick:main",
+                     "joule-planner=joule.planner:main"]},
       packages=['joule'],
       license = "Python",
       platforms="any"
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Tests of the airtime tables against the recursive model they replaced.
+"""
+
+import os
+import sys
+import math
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'joule'))
+
+from airtime import MODES, MAX_LENGTH, DEFAULT_MTU
+from airtime import tx_usec, tx_usec_table, max_tps
+
+def compute_tx_usec(hwmode, channel, streams, length, mtu=DEFAULT_MTU):
+    """ The recursive model of the profiler, with the preamble and the
+    encoding overhead of the mode instead of the 11a constants. """
+
+    if length > mtu:
+        return (compute_tx_usec(hwmode, channel, streams, length // 2, mtu) +
+                compute_tx_usec(hwmode, channel, streams, length // 2, mtu))
+
+    mode = MODES[(hwmode, channel, streams)]
+
+    length = length + 8 + 20 + 28 + 8
+
+    symbols = math.ceil(float(length * 8 + mode['overhead_bits']) /
+                        mode['bits_per_symbol'])
+
+    data = mode['preamble'] + symbols * mode['symbol_duration']
+
+    ack = 20 + mode['symbol_duration']
+
+    backoff = mode['slot'] * mode['min_cw']
+
+    return mode['difs'] + data + mode['sifs'] + ack + backoff
+
+def lengths(mtu):
+    """ Return the payload lengths checked: all the short ones, the ones
+    around every split and a random sample of the others. """
+
+    checked = set(range(0, 2 * mtu + 4))
+
+    edge = mtu
+    while edge <= MAX_LENGTH:
+        checked.update([edge - 1, edge, edge + 1, 2 * edge + 1])
+        edge = 2 * edge + 1
+
+    rand = np.random.RandomState(0)
+    checked.update(rand.randint(0, MAX_LENGTH + 1, 2000).tolist())
+    checked.add(MAX_LENGTH)
+
+    return sorted(x for x in checked if x <= MAX_LENGTH)
+
+class TestAirtime(unittest.TestCase):
+    """ Airtime tables. """
+
+    def test_11a(self):
+        # the constants of the original 11a model
+        self.assertEqual(MODES[('11a', '20', 1)]['preamble'], 20)
+        self.assertEqual(MODES[('11a', '20', 1)]['overhead_bits'], 6)
+
+        table = tx_usec_table('11a', '20', 1)
+        for length in lengths(DEFAULT_MTU):
+            self.assertEqual(table[length],
+                             compute_tx_usec('11a', '20', 1, length))
+
+    def test_modes(self):
+        for (hwmode, channel, streams) in sorted(MODES):
+            table = tx_usec_table(hwmode, channel, streams)
+            expected = [compute_tx_usec(hwmode, channel, streams, length)
+                        for length in lengths(DEFAULT_MTU)]
+            np.testing.assert_array_equal(table[lengths(DEFAULT_MTU)],
+                                          expected)
+
+    def test_mtu(self):
+        for mtu in (100, 1000, 1500, 2304):
+            table = tx_usec_table('11a', '20', 1, mtu)
+            for length in lengths(mtu):
+                self.assertEqual(table[length],
+                                 compute_tx_usec('11a', '20', 1, length, mtu))
+
+    def test_sizes(self):
+        sizes = np.array([[64, 512], [1472, 1473]])
+
+        np.testing.assert_array_equal(tx_usec('11a', '20', 1, sizes),
+                                      tx_usec_table('11a', '20', 1)[sizes])
+        self.assertEqual(max_tps('11a', '20', 1, 1472),
+                         1000000 / compute_tx_usec('11a', '20', 1, 1472))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, tx_usec, '11a', '20', 1, -1)
+        self.assertRaises(ValueError, tx_usec, '11a', '20', 1,
+                          [64, MAX_LENGTH + 1])
+        self.assertRaises(KeyError, tx_usec_table, '11b', '20', 1)
+
+if __name__ == '__main__':
+    unittest.main()
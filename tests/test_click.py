@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Tests of the ControlSocket client. Replies are either scripted, to control
+how they are split across the reads of the client, or served by the element
+emulations of the mock click.
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'joule'))
+
+from click import ControlSocket, BUFFER_SIZE
+from mockclick import MockProbe
+
+BANNER = b"Click::ControlSocket/1.3\r\n"
+
+class ScriptedServer(threading.Thread):
+    """ Serve one session per entry of sessions. The banner is sent first,
+    then every statement received is answered with the next reply of the
+    session. Banner and replies are sent one piece at a time if they are
+    lists. The session is closed when its replies are over or when the
+    reply is None. """
+
+    def __init__(self, sessions, banner=BANNER):
+
+        super(ScriptedServer, self).__init__()
+        self.daemon = True
+        self.sessions = sessions
+        self.banner = banner
+        self.statements = []
+        self.accepted = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.sock.settimeout(5.0)
+        self.port = self.sock.getsockname()[1]
+
+    def send(self, conn, reply):
+        """ Send a reply, pausing after every piece of a list so that the
+        pieces are received separately. """
+
+        if not isinstance(reply, list):
+            conn.sendall(reply)
+            return
+
+        for piece in reply:
+            conn.sendall(piece)
+            time.sleep(0.01)
+
+    def run(self):
+
+        for replies in self.sessions:
+
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                break
+
+            self.accepted += 1
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            rfile = conn.makefile('rb')
+
+            try:
+                self.send(conn, self.banner)
+                for reply in replies:
+                    line = rfile.readline()
+                    if not line:
+                        break
+                    self.statements.append(line.strip().decode('latin-1'))
+                    if reply is None:
+                        break
+                    self.send(conn, reply)
+            finally:
+                rfile.close()
+                conn.close()
+
+        self.sock.close()
+
+def scripted(*sessions, **kwargs):
+    """ Start a ScriptedServer and return it with a session to it. """
+
+    server = ScriptedServer(list(sessions), **kwargs)
+    server.start()
+
+    return server, ControlSocket('127.0.0.1', server.port, timeout=2.0)
+
+class TestParser(unittest.TestCase):
+    """ Parsing of replies split across the reads of the client. """
+
+    def test_split_data(self):
+        payload = b"".join([b"%05u\n" % i for i in range(0, BUFFER_SIZE)])
+        reply = (b"200 Read handler 'src.data' OK\r\nDATA %u\r\n" %
+                 len(payload)) + payload
+        pieces = [reply[0:1], reply[1:30], reply[30:31], reply[31:42],
+                  reply[42:50], reply[50:BUFFER_SIZE + 7],
+                  reply[BUFFER_SIZE + 7:]]
+        server, ctrl = scripted([pieces, b"200 Write handler 'x' OK\r\n"])
+
+        self.assertEqual(ctrl.execute('READ', 'src.data'),
+                         ['200', "Read handler 'src.data' OK",
+                          payload.decode('latin-1')])
+        self.assertEqual(ctrl.execute('WRITE', 'x'),
+                         ['200', "Write handler 'x' OK", ''])
+
+        ctrl.close()
+        server.join()
+
+    def test_split_banner(self):
+        banner = [BANNER[0:5], BANNER[5:-1], BANNER[-1:]]
+        server, ctrl = scripted([b"200 Read handler 'a' OK\r\nDATA 1\r\n1"],
+                                banner=banner)
+
+        self.assertEqual(ctrl.execute('READ', 'a'),
+                         ['200', "Read handler 'a' OK", '1'])
+
+        ctrl.close()
+        server.join()
+
+    def test_multiline(self):
+        long_line = b"x" * (2 * BUFFER_SIZE)
+        reply = [b"200-first\r\n200-" + long_line[0:10],
+                 long_line[10:] + b"\r\n200",
+                 b" Read handler 'a' OK\r",
+                 b"\nDATA 2\r\nok"]
+        server, ctrl = scripted([reply, b"520-\r\n520 error\r\n"])
+
+        self.assertEqual(ctrl.execute('READ', 'a'),
+                         ['200', "Read handler 'a' OK", 'ok'])
+        self.assertEqual(ctrl.execute('WRITE', 'b 1'),
+                         ['520', "error", ''])
+
+        ctrl.close()
+        server.join()
+
+    def test_pipelined(self):
+        replies = [b"200 Read handler 'a' OK\r\nDATA 3\r\n%03u" % i
+                   for i in range(0, 300)]
+        server, ctrl = scripted([b"".join(replies)] + [b""] * 299)
+
+        responses = ctrl.execute_batch([('READ', 'a')] * 300)
+
+        self.assertEqual([x[2] for x in responses],
+                         ["%03u" % i for i in range(0, 300)])
+        self.assertEqual(len(ctrl.buf), BUFFER_SIZE)
+
+        ctrl.close()
+        server.join()
+
+    def test_not_click(self):
+        server, ctrl = scripted([], banner=b"SSH-2.0\r\n")
+
+        self.assertEqual(ctrl.execute('READ', 'a'), None)
+
+        server.join()
+
+class TestSession(unittest.TestCase):
+    """ Reopening of pooled sessions. """
+
+    def test_stale_session(self):
+        ok = b"200 Write handler 'a' OK\r\n"
+        server, ctrl = scripted([ok], [ok])
+
+        ctrl.execute('WRITE', 'a 1')
+        time.sleep(0.1)
+
+        self.assertEqual(ctrl.execute('WRITE', 'a 2'),
+                         ['200', "Write handler 'a' OK", ''])
+        self.assertEqual(ctrl.sessions, 2)
+        self.assertEqual(server.statements, ['WRITE a 1', 'WRITE a 2'])
+
+        ctrl.close()
+        server.join()
+
+    def test_reopened_once(self):
+        ok = b"200 Write handler 'a' OK\r\n"
+        server, ctrl = scripted([ok], [None], [ok])
+
+        ctrl.execute('WRITE', 'a 1')
+        time.sleep(0.1)
+
+        self.assertRaises(socket.error, ctrl.execute, 'WRITE', 'a 2')
+        self.assertEqual(ctrl.sessions, 2)
+        self.assertEqual(server.statements, ['WRITE a 1', 'WRITE a 2'])
+
+        self.assertEqual(ctrl.execute('WRITE', 'a 3'),
+                         ['200', "Write handler 'a' OK", ''])
+
+        ctrl.close()
+        server.join()
+
+    def test_partial_reply(self):
+        ok = b"200 Write handler 'a' OK\r\n"
+        server, ctrl = scripted([ok, b"200 Write"], [ok])
+
+        ctrl.execute('WRITE', 'a 1')
+
+        self.assertRaises(socket.error, ctrl.execute, 'WRITE', 'a 2')
+        self.assertEqual(ctrl.sessions, 1)
+        self.assertEqual(server.statements, ['WRITE a 1', 'WRITE a 2'])
+
+        self.assertEqual(ctrl.execute('WRITE', 'a 3'),
+                         ['200', "Write handler 'a' OK", ''])
+        self.assertEqual(server.statements,
+                         ['WRITE a 1', 'WRITE a 2', 'WRITE a 3'])
+
+        ctrl.close()
+        server.join()
+
+    def test_new_session(self):
+        server, ctrl = scripted([None])
+
+        self.assertRaises(socket.error, ctrl.execute, 'WRITE', 'a 1')
+        self.assertEqual(ctrl.sessions, 1)
+
+        server.join()
+
+class TestBatch(unittest.TestCase):
+    """ Pipelined batches against the mock click. """
+
+    def setUp(self):
+        self.probe = MockProbe(0, 0)
+        self.probe.start()
+        self.ctrl = ControlSocket('127.0.0.1', self.probe.sender.port)
+
+    def tearDown(self):
+        self.ctrl.close()
+        self.probe.stop()
+
+    def test_mixed(self):
+        statements = [('WRITE', 'src.rate 100'),
+                      ('READ', 'src.rate'),
+                      ('WRITE', 'src.length 512'),
+                      ('READ', 'src.length'),
+                      ('WRITE', 'src.rate fast'),
+                      ('READ', 'src.active'),
+                      ('READ', 'nosuch.count'),
+                      ('WRITE', 'src.nosuch 1'),
+                      ('READ', 'counter_client.count'),
+                      ('READ', 'list')]
+
+        responses = self.ctrl.execute_batch(statements)
+
+        self.assertEqual([x[0] for x in responses],
+                         ['200', '200', '200', '200', '520', '200', '510',
+                          '511', '200', '200'])
+        self.assertEqual([x[2] for x in responses],
+                         ['', '100', '', '512', '', 'false', '', '', '0',
+                          "4\ncounter_client\nsha\nsrc\ntr_client\n"])
+        self.assertEqual(self.probe.src.rate, 100)
+        self.assertEqual(self.probe.src.length, 512)
+
+    def test_batches(self):
+        for rate in range(1, 50):
+            statements = [('WRITE', 'src.rate %u' % rate),
+                          ('READ', 'src.rate')] * 3
+            responses = self.ctrl.execute_batch(statements)
+            self.assertEqual([x[2] for x in responses[1::2]],
+                             [str(rate)] * 3)
+
+        self.assertEqual(self.ctrl.sessions, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Tests of the journal and of the recovery of an interrupted campaign.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'joule'))
+
+from journal import Journal, write_atomically
+from profiler import restore_journal, stint_key
+from scheduler import DEFAULT_METER
+
+def descriptor():
+    """ Return a descriptor with two meters and three stints. """
+
+    stints = [{'src' : 'A', 'dst' : 'B', 'bitrate_mbps' : rate,
+               'packetsize_bytes' : 1024, 'duration_s' : 10}
+              for rate in (1, 2, 3)]
+
+    return {'idle' : {'duration_s' : 10},
+            'meters' : {'B' : {}},
+            'stints' : stints}
+
+class TestJournal(unittest.TestCase):
+    """ Journal writing and loading. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'joule.json.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, entries, tail=''):
+        """ Write a journal with entries and a truncated last line. """
+
+        journal = Journal(self.path)
+        journal.open()
+        for entry in entries:
+            journal.append(entry)
+        journal.close()
+
+        with open(self.path, 'a') as journal_file:
+            journal_file.write(tail)
+
+    def test_missing(self):
+        self.assertEqual(Journal(self.path).load(), [])
+
+    def test_append(self):
+        entries = [{'stint' : i, 'stats' : {'mean' : 0.5 * i}}
+                   for i in range(0, 3)]
+        self.write(entries)
+
+        self.assertEqual(Journal(self.path).load(), entries)
+
+    def test_truncated(self):
+        entries = [{'stint' : 0, 'stats' : {'mean' : 1.0}}]
+        self.write(entries, '{"stint":1,"stats":{"me')
+
+        self.assertEqual(Journal(self.path).load(), entries)
+
+    def test_resume(self):
+        entries = [{'stint' : 0, 'stats' : {'mean' : 1.0}}]
+        self.write(entries, '{"stint":1,"stats":{"me')
+
+        journal = Journal(self.path)
+        journal.open(resume=True)
+        journal.append({'stint' : 1, 'stats' : {'mean' : 2.0}})
+        journal.close()
+
+        self.assertEqual(Journal(self.path).load(),
+                         entries + [{'stint' : 1, 'stats' : {'mean' : 2.0}}])
+
+    def test_resume_complete(self):
+        entries = [{'stint' : 0, 'stats' : {'mean' : 1.0}}]
+        self.write(entries)
+
+        journal = Journal(self.path)
+        journal.open(resume=True)
+        journal.append({'stint' : 1, 'stats' : {'mean' : 2.0}})
+        journal.close()
+
+        with open(self.path) as journal_file:
+            self.assertEqual(len(journal_file.readlines()), 2)
+
+    def test_restart(self):
+        self.write([{'stint' : 0, 'stats' : {'mean' : 1.0}}])
+
+        journal = Journal(self.path)
+        journal.open()
+        journal.close()
+
+        self.assertEqual(Journal(self.path).load(), [])
+
+    def test_write_atomically(self):
+        path = os.path.join(self.tmp, 'joule.json')
+        write_atomically(path, descriptor())
+        write_atomically(path, {'stints' : []})
+
+        self.assertEqual(os.listdir(self.tmp), ['joule.json'])
+        with open(path) as data_file:
+            self.assertEqual(json.load(data_file), {'stints' : []})
+
+class TestRestore(unittest.TestCase):
+    """ Recovery of the results saved in the journal. """
+
+    def test_restore(self):
+        data = descriptor()
+        stats = {'mean' : 1.0, 'median' : 1.0, 'ci' : 0.1}
+        entries = [{'idle' : DEFAULT_METER, 'stats' : stats},
+                   {'idle' : 'B', 'stats' : stats},
+                   {'idle' : 'C', 'stats' : stats},
+                   {'stint' : 0, 'key' : stint_key(data['stints'][0]),
+                    'stats' : stats},
+                   {'stint' : 1, 'key' : stint_key(data['stints'][2]),
+                    'stats' : stats},
+                   {'stint' : 5, 'key' : stint_key(data['stints'][0]),
+                    'stats' : stats}]
+
+        idles, completed = restore_journal(data, entries)
+
+        self.assertEqual(idles, set([DEFAULT_METER, 'B']))
+        self.assertEqual(completed, set([0]))
+        self.assertEqual(data['idle']['stats'], stats)
+        self.assertEqual(data['meters']['B']['idle']['stats'], stats)
+        self.assertEqual(data['stints'][0]['stats'], stats)
+        self.assertTrue('stats' not in data['stints'][1])
+        self.assertTrue('stats' not in data['stints'][2])
+
+if __name__ == '__main__':
+    unittest.main()
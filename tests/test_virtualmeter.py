@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013, Roberto Riggio
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CREATE-NET nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY CREATE-NET ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CREATE-NET BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Tests of the virtual meter binning against the loop it replaced, with the
+histograms served by the mock click monitor.
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'joule'))
+
+import virtualmeter
+
+from click import close_all
+from mockclick import MockMonitor
+from virtualmeter import VirtualMeter, parse_aggregates
+
+SIZES = ['64', '512', '1024', '1472']
+
+MODELS = {'RX' : {'alpha0' : 1.0,
+                  'alpha1' : 10.0,
+                  'x_max' : dict((x, 30.0) for x in SIZES)},
+          'TX' : {'alpha0' : 2.0,
+                  'alpha1' : 20.0,
+                  'x_max' : dict((x, 30.0) for x in SIZES)},
+          'gamma' : 5.0}
+
+def loop_bins(packet_sizes, samples):
+    """ The binning loop of the original virtual meter. """
+
+    bins = np.zeros(shape=(len(packet_sizes), 1))
+    for sample in samples:
+        if len(sample) == 0:
+            continue
+        # account for ethernet (14), ip (20), and udp (8) headers
+        size = sample[0] - 14 - 20 - 8
+        count = sample[1]
+        for i in range(0, len(packet_sizes)):
+            if size <= packet_sizes[i]:
+                bins[i] = bins[i] + count
+                break
+    return bins
+
+class TestVirtualMeter(unittest.TestCase):
+    """ Binning of the packet length histograms. """
+
+    def setUp(self):
+        self.monitor = MockMonitor(0)
+        self.monitor.start()
+        self.port = virtualmeter.MONITOR_PORT
+        virtualmeter.MONITOR_PORT = self.monitor.server.port
+        self.meter = VirtualMeter(MODELS, 0)
+
+    def tearDown(self):
+        virtualmeter.MONITOR_PORT = self.port
+        close_all()
+        self.monitor.stop()
+
+    def test_bin_samples(self):
+        rand = np.random.RandomState(0)
+        edges = [int(x) + 42 for x in SIZES]
+        lengths = np.concatenate((rand.randint(0, 2000, 500),
+                                  edges,
+                                  np.array(edges) + 1,
+                                  np.array(edges) - 1))
+        samples = np.column_stack((lengths,
+                                   rand.randint(0, 1000, len(lengths))))
+
+        for model in ('RX', 'TX'):
+            np.testing.assert_array_equal(
+                self.meter.bin_samples(model, samples),
+                loop_bins(self.meter.packet_sizes[model], samples))
+
+    def test_generate_bins(self):
+        for length, count in ((10, 3), (64, 5), (65, 7), (1472, 11),
+                              (1473, 13), (1000, 17)):
+            self.monitor.rx.push(count, length, 0.0, 0.0)
+
+        samples = parse_aggregates(self.monitor.rx.text())
+        bins = self.meter.generate_bins('RX')
+
+        np.testing.assert_array_equal(bins,
+                                      loop_bins(self.meter.packet_sizes['RX'],
+                                                samples))
+        self.assertEqual(bins.ravel().tolist(), [8.0, 7.0, 17.0, 11.0])
+
+    def test_empty(self):
+        np.testing.assert_array_equal(self.meter.generate_bins('TX'),
+                                      np.zeros(shape=(len(SIZES), 1)))
+
+    def test_parse_aggregates(self):
+        text = "!IPAggregate 1.0\n!num_nonzero 2\n106 4\n1514 2\n"
+
+        self.assertEqual(parse_aggregates(text).tolist(),
+                         [[106, 4], [1514, 2]])
+        self.assertEqual(parse_aggregates("!num_nonzero 0\n").shape, (0, 2))
+
+if __name__ == '__main__':
+    unittest.main()